@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class QuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz'
+
+    def ready(self):
+        # Connects the signal receivers that keep cached pages fresh.
+        from . import caching  # noqa: F401
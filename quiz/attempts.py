@@ -0,0 +1,42 @@
+from django.db import transaction
+
+from . import caching, leaderboard, stats
+from .grading import pack_answers, pack_question_ids
+from .models import Score, UserStats
+
+
+@transaction.atomic
+def record_attempt(user, subject, score, total, percentage, key=None, answers=None, attempt_id=None):
+    """Store a graded attempt and keep the derived tables in step with it.
+
+    ``key`` and ``answers`` are the AnswerKey the attempt was graded with
+    and the choices made. They are kept packed on the Score so the attempt
+    can be re-graded later, and feed the per-question statistics.
+    ``attempt_id`` is unique, so the same attempt can't be stored twice.
+    """
+    attempt = Score.objects.create(
+        user=user,
+        subject=subject,
+        score=score,
+        total=total,
+        percentage=percentage,
+        question_ids=None if key is None else pack_question_ids(key.question_ids),
+        answers=None if answers is None else pack_answers(answers),
+        attempt_id=attempt_id
+    )
+    leaderboard.record_score(attempt)
+    stats.record_score(attempt)
+    if key is not None and answers is not None:
+        stats.record_answers(key, answers, percentage)
+    caching.bump_on_commit(caching.SCORES)
+    return attempt
+
+
+@transaction.atomic
+def clear_attempts(user):
+    subjects = list(UserStats.objects.filter(user=user).values_list('subject', flat=True))
+    attempts = Score.objects.filter(user=user)
+    stats.remove_answers(attempts.filter(answers__isnull=False).values_list('question_ids', 'answers', 'percentage'))
+    attempts.delete()
+    leaderboard.remove_user(user, subjects)
+    stats.remove_user(user)
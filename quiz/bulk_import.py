@@ -0,0 +1,132 @@
+# Parsing and validation for bulk question imports. Rows come out as
+# ``(line, subject, entry)`` with ``entry`` in the questions.json shape;
+# QuestionBank.import_rows does the writing.
+import csv
+import hashlib
+import json
+
+
+FORMATS = ('json', 'ndjson', 'csv')
+OPTION_COUNT = 4
+MAX_OPTION_LENGTH = 255
+
+
+class RowError(ValueError):
+    """A row, or with ``line`` None the whole file, that can't be read."""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+
+def content_hash(text, options, correct):
+    """Fingerprint of a question's content, used to skip re-imports."""
+    payload = json.dumps([text.strip(), [option.strip() for option in options], correct])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def format_for(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'ndjson'
+    return extension if extension in FORMATS else None
+
+
+def validate(subject, entry):
+    """Return ``entry`` normalised to ``{question, options, correct}`` or
+    raise ValueError saying what is wrong with it."""
+    if not isinstance(subject, str) or not subject.strip():
+        raise ValueError('subject is missing')
+    if len(subject.strip()) > 100:
+        raise ValueError('subject is longer than 100 characters')
+    if not isinstance(entry, dict):
+        raise ValueError('entry must be an object')
+
+    text = entry.get('question')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError('question is missing')
+
+    options = entry.get('options')
+    if not isinstance(options, list) or not all(isinstance(option, str) for option in options):
+        raise ValueError('options must be a list of strings')
+    options = [option.strip() for option in options]
+    if len(options) != OPTION_COUNT:
+        raise ValueError(f'needs exactly {OPTION_COUNT} options, got {len(options)}')
+    if not all(options):
+        raise ValueError('options must not be empty')
+    if any(len(option) > MAX_OPTION_LENGTH for option in options):
+        raise ValueError(f'options must be at most {MAX_OPTION_LENGTH} characters')
+
+    correct = entry.get('correct')
+    if isinstance(correct, str) and correct.strip().isdigit():
+        correct = int(correct)
+    if not isinstance(correct, int) or isinstance(correct, bool) or not 0 <= correct < len(options):
+        raise ValueError(f'correct must be an option index from 0 to {len(options) - 1}')
+
+    return {'question': text.strip(), 'options': options, 'correct': correct}
+
+
+def rows_from_mapping(data):
+    """Rows of an already-loaded ``{subject: [entry, ...]}`` mapping. In
+    place of a line number each row is labelled ``subject[index]``."""
+    if not isinstance(data, dict):
+        raise RowError(None, 'expected an object mapping subjects to question lists')
+    for subject, entries in data.items():
+        if not isinstance(entries, list):
+            raise RowError(None, f'{subject}: expected a list of questions')
+        for i, entry in enumerate(entries):
+            yield f'{subject}[{i}]', subject, entry
+
+
+def _json_rows(f):
+    # questions.json is a single document, so it has to be loaded whole;
+    # NDJSON and CSV are read a line at a time.
+    try:
+        data = json.load(f)
+    except ValueError as e:
+        raise RowError(None, f'invalid JSON: {e}')
+    yield from rows_from_mapping(data)
+
+
+def _ndjson_rows(f):
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, None, RowError(line, f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line, None, RowError(line, 'expected an object')
+            continue
+        yield line, row.get('subject'), row
+
+
+def _csv_rows(f):
+    # Columns: subject, question, option1..option4 and correct, the
+    # 0-based index of the right option.
+    reader = csv.DictReader(f)
+    option_columns = sorted(
+        (name for name in reader.fieldnames or [] if name.startswith('option')),
+        key=lambda name: int(name[6:]) if name[6:].isdigit() else 0,
+    )
+    for row in reader:
+        options = [(row.get(name) or '').strip() for name in option_columns]
+        yield reader.line_num, row.get('subject'), {
+            'question': row.get('question'),
+            'options': options,
+            'correct': row.get('correct'),
+        }
+
+
+def parse(f, fmt):
+    """Yield ``(line, subject, entry)`` from the text file ``f``. A row that
+    can't be parsed is yielded with a RowError as its entry."""
+    if fmt == 'json':
+        return _json_rows(f)
+    if fmt == 'ndjson':
+        return _ndjson_rows(f)
+    if fmt == 'csv':
+        return _csv_rows(f)
+    raise ValueError(f'format must be one of {", ".join(FORMATS)}')
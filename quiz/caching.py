@@ -0,0 +1,82 @@
+import secrets
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+# What a cached payload was built from. Each scope has a version token in
+# the cache, and a payload is stored with the tokens of the scopes it read.
+SCORES = 'scores'
+QUESTIONS = 'questions'
+
+# Each payload has one key that every rebuild overwrites, so nothing is
+# orphaned; this only bounds how long an unused page's payload stays.
+PAYLOAD_TIMEOUT = 24 * 60 * 60
+
+
+def local_caches():
+    """An in-process stand-in for every configured cache alias.
+
+    Runs against a throwaway database (tests, the benchmark) switch to
+    these with override_settings, so the version tokens and payloads they
+    build never reach, or clear, the caches the real site reads.
+    """
+    return {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'quiz-local-{alias}'}
+        for alias in settings.CACHES
+    }
+
+
+def _version_key(scope):
+    return f'quiz:version:{scope}'
+
+
+def bump(*scopes):
+    """Give ``scopes`` new random version tokens, so every payload built
+    from them is rebuilt on its next read.
+
+    Tokens are random rather than counters, so a reader that computed a
+    payload from old data and stores it late stores it with tokens that
+    will never match again.
+    """
+    cache.set_many({_version_key(scope): secrets.token_hex(8) for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    transaction.on_commit(partial(bump, *scopes))
+
+
+# Deleting a user (in the admin, say) cascades to their scores and
+# leaderboard entries without going through quiz.attempts. The receiver is
+# on User rather than on those models, so their own deletes stay fast.
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _bump_on_user_delete(sender, using, **kwargs):
+    transaction.on_commit(partial(bump, SCORES), using=using)
+
+
+async def _versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, secrets.token_hex(8), None)
+        versions = await cache.aget_many(keys)
+    return [versions[key] for key in keys]
+
+
+async def acached(name, scopes, compute):
+    """Return the payload ``name`` built by the coroutine function
+    ``compute``, from the cache while none of ``scopes`` has changed."""
+    versions = await _versions(scopes)
+    key = f'quiz:{name}'
+    cached = await cache.aget(key)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+    value = await compute()
+    await cache.aset(key, (versions, value), PAYLOAD_TIMEOUT)
+    return value
@@ -0,0 +1,91 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Score
+
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+COLUMNS = ('id', 'username', 'subject', 'score', 'total', 'percentage', 'date')
+
+
+def parse_day(value, name):
+    """``YYYY-MM-DD`` as the aware datetime that day starts, or None if
+    ``value`` is empty."""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD form')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def score_rows(subject=None, start=None, end=None):
+    """Attempts in id order as ``COLUMNS`` tuples, optionally limited to
+    ``subject`` and to days ``start`` through ``end``.
+
+    Only the exported columns are selected and usernames come from a join
+    in the same query. The export functions page through it by id, so each
+    chunk is one indexed range read and memory stays flat however many
+    rows match.
+    """
+    scores = Score.objects.all()
+    if subject:
+        scores = scores.filter(subject=subject)
+    if start is not None:
+        scores = scores.filter(date__gte=start)
+    if end is not None:
+        scores = scores.filter(date__lt=end + timedelta(days=1))
+    return scores.order_by('id').values_list(
+        'id', 'user__username', 'subject', 'score', 'total', 'percentage', 'date',
+    )
+
+
+class _Line:
+    # csv.writer wants a file; this one hands back each formatted row.
+    def write(self, value):
+        return value
+
+
+_csv = csv.writer(_Line())
+
+
+def header(fmt):
+    return _csv.writerow(COLUMNS) if fmt == 'csv' else ''
+
+
+def format_row(fmt, row):
+    row = row[:-1] + (row[-1].isoformat(),)
+    if fmt == 'csv':
+        return _csv.writerow(row)
+    return json.dumps(dict(zip(COLUMNS, row))) + '\n'
+
+
+def export_lines(fmt, rows, chunk_size=CHUNK_SIZE):
+    """Stream ``rows`` as ``fmt`` text, one piece per ``chunk_size`` rows."""
+    yield header(fmt)
+    last_id = 0
+    while True:
+        chunk = list(rows.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        yield ''.join([format_row(fmt, row) for row in chunk])
+
+
+async def aexport_lines(fmt, rows, chunk_size=CHUNK_SIZE):
+    yield header(fmt)
+    last_id = 0
+    while True:
+        chunk = [row async for row in rows.filter(id__gt=last_id)[:chunk_size]]
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        yield ''.join([format_row(fmt, row) for row in chunk])
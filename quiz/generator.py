@@ -0,0 +1,75 @@
+import random
+
+from django.conf import settings
+
+from .models import Question
+
+
+QUESTIONS_PER_ATTEMPT = 10
+# Questions nobody has answered yet are treated as middling difficulty.
+UNKNOWN_DIFFICULTY = 0.5
+
+
+def questions_per_attempt():
+    return getattr(settings, 'QUIZ_QUESTIONS_PER_ATTEMPT', QUESTIONS_PER_ATTEMPT)
+
+
+def _correct_rate(correct_count, responses):
+    return correct_count / responses if responses else UNKNOWN_DIFFICULTY
+
+
+def _pool(subject):
+    return Question.objects.filter(subject__name=subject).values_list('id', 'stats__correct_count', 'stats__responses')
+
+
+def _pick(pool, count, stratify, rng):
+    if count is None or count >= len(pool):
+        picked = [question_id for question_id, _, _ in pool]
+    elif stratify:
+        pool.sort(key=lambda row: _correct_rate(row[1], row[2]))
+        picked = [
+            pool[rng.randrange(band * len(pool) // count, (band + 1) * len(pool) // count)][0]
+            for band in range(count)
+        ]
+    else:
+        picked = [question_id for question_id, _, _ in rng.sample(pool, count)]
+    rng.shuffle(picked)
+    return picked
+
+
+def sample_questions(subject, count, stratify=True, rng=random):
+    """Pick ``count`` question ids of ``subject`` for one attempt.
+
+    Only ids and answer counters are read, never question text. With
+    ``stratify`` the pool is ordered by correct rate and cut into ``count``
+    equal bands, one question drawn from each, so every attempt spans the
+    subject's range of difficulty. The picks are returned shuffled.
+    """
+    return _pick(list(_pool(subject)), count, stratify, rng)
+
+
+async def asample_questions(subject, count, stratify=True, rng=random):
+    return _pick([row async for row in _pool(subject)], count, stratify, rng)
+
+
+def shuffle_options(questions, rng=random):
+    """Shuffle each question's options in place.
+
+    Returns each question's order as a string of original option indexes:
+    ``'2031'`` means the first option shown is the original option 2.
+    """
+    orders = []
+    for question in questions:
+        order = list(range(len(question['options'])))
+        rng.shuffle(order)
+        question['options'] = [question['options'][i] for i in order]
+        orders.append(''.join(map(str, order)))
+    return orders
+
+
+def unshuffle_answers(answers, orders):
+    """Map choices made on shuffled options back to original option indexes."""
+    for i, (choice, order) in enumerate(zip(answers, orders)):
+        if 0 <= choice < len(order):
+            answers[i] = int(order[choice])
+    return answers
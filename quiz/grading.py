@@ -0,0 +1,143 @@
+# Grading shared by the web app, quizify and bulk re-grading. Keep this
+# module free of Django imports so the Tk app can use it too.
+import sys
+from array import array
+
+
+UNANSWERED = -1
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+# Attempts are stored as two blobs: the question ids in the order they were
+# asked (8 bytes each) and the chosen option per question (1 byte each).
+def pack_question_ids(question_ids):
+    return _pack('q', question_ids)
+
+
+def unpack_question_ids(data):
+    return _unpack('q', data)
+
+
+def pack_answers(answers):
+    return _pack('b', answers)
+
+
+def unpack_answers(data):
+    return _unpack('b', data)
+
+
+def answers_from_form(data, count, prefix='question_'):
+    """Collect ``question_<i>`` choices from submitted form data.
+
+    Missing or malformed choices are recorded as UNANSWERED instead of
+    failing the whole submission.
+    """
+    answers = array('b', [UNANSWERED]) * count
+    for i in range(count):
+        value = data.get(f'{prefix}{i}')
+        if value is not None and value.isdecimal() and int(value) < 128:
+            answers[i] = int(value)
+    return answers
+
+
+def _matches(key, answers):
+    # XOR the packed bytes as two big integers: every zero byte of the
+    # result is a question answered correctly. Both the XOR and the count
+    # run in C, so this scales to long exams and large batches.
+    diff = int.from_bytes(key, 'little') ^ int.from_bytes(answers, 'little')
+    return diff.to_bytes(len(key), 'little')
+
+
+def grade_packed(pairs):
+    """Score ``(key, answers)`` pairs of packed bytes, each ``answers`` as
+    long as its ``key``, with a single comparison over all of them.
+
+    Unlike AnswerKey.grade_many the attempts don't have to share a key,
+    so attempts that were each asked a different set of questions can
+    still be graded as one batch.
+    """
+    keys = b''.join([key for key, _ in pairs])
+    if not keys:
+        return [0] * len(pairs)
+    matches = _matches(keys, b''.join([answers for _, answers in pairs]))
+    scores = []
+    start = 0
+    for key, _ in pairs:
+        scores.append(matches.count(0, start, start + len(key)))
+        start += len(key)
+    return scores
+
+
+def _packed(answers, size):
+    answers = array('b', answers[:size])
+    if len(answers) < size:
+        answers.extend(array('b', [UNANSWERED]) * (size - len(answers)))
+    return answers.tobytes()
+
+
+class AnswerKey:
+    """A subject's correct options compiled into a packed byte array."""
+
+    __slots__ = ('question_ids', 'correct', '_key', '_positions')
+
+    def __init__(self, question_ids, correct):
+        self.question_ids = array('q', question_ids)
+        self.correct = array('b', correct)
+        self._key = self.correct.tobytes()
+        self._positions = None
+
+    @classmethod
+    def from_questions(cls, questions):
+        """Build a key from ``{id, correct}`` question dicts."""
+        return cls([q['id'] for q in questions], [q['correct'] for q in questions])
+
+    def __len__(self):
+        return len(self.correct)
+
+    def subset(self, question_ids):
+        """The key for just ``question_ids``, in that order.
+
+        Returns ``(key, kept)`` where ``kept`` are the indexes into
+        ``question_ids`` of the questions this key still has.
+        """
+        if self._positions is None:
+            self._positions = {question_id: i for i, question_id in enumerate(self.question_ids)}
+        kept = [i for i, question_id in enumerate(question_ids) if question_id in self._positions]
+        return AnswerKey(
+            [question_ids[i] for i in kept],
+            [self.correct[self._positions[question_ids[i]]] for i in kept],
+        ), kept
+
+    def grade(self, answers):
+        if not self._key:
+            return 0
+        return _matches(self._key, _packed(answers, len(self._key))).count(0)
+
+    def grade_many(self, answer_vectors):
+        """Grade several attempts of this key in one pass.
+
+        The vectors are laid end to end and compared against the key
+        repeated once per attempt; each attempt's score is then a count
+        over its slice of the result.
+        """
+        size = len(self._key)
+        if not size or not answer_vectors:
+            return [0] * len(answer_vectors)
+
+        flat = b''.join([_packed(answers, size) for answers in answer_vectors])
+        matches = _matches(self._key * len(answer_vectors), flat)
+        return [matches.count(0, start, start + size) for start in range(0, len(matches), size)]
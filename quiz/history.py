@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q, Sum
+
+from .models import Score, UserStats
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_CHART_POINTS = 300
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(date, pk):
+    return f'{(date - EPOCH) // MICROSECOND}_{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + int(micros) * MICROSECOND, int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+def score_page(user, cursor=None, limit=PAGE_SIZE):
+    """One page of ``user``'s attempts, newest first.
+
+    Pages are keyed on ``(date, id)`` of the last row returned rather than
+    an offset, so every page is a single range read on the (user, date)
+    index no matter how deep into the history it is.
+    """
+    scores = Score.objects.filter(user=user)
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        date, pk = position
+        scores = scores.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+
+    rows = list(
+        scores
+        .order_by('-date', '-id')
+        .values('id', 'subject', 'score', 'total', 'percentage', 'date')[:limit + 1]
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+async def aattempt_count(user):
+    totals = await UserStats.objects.filter(user=user).aaggregate(attempts=Sum('count'))
+    return totals['attempts'] or 0
+
+
+async def ascore_series(user, total, max_points=MAX_CHART_POINTS):
+    """``user``'s ``total`` percentages in attempt order, averaged over
+    fixed windows so that at most ``max_points`` points come back.
+
+    Returns ``(attempts, percentages)`` where each attempt number is the
+    last attempt of its window. Rows are streamed, so memory is bounded by
+    ``max_points`` rather than by the length of the history.
+    """
+    if total == 0:
+        return [], []
+
+    points = min(total, max_points)
+    sums = [0.0] * points
+    counts = [0] * points
+    last = [0] * points
+    percentages = (
+        Score.objects.filter(user=user)
+        .order_by('date', 'id')
+        .values_list('percentage', flat=True)
+    )
+    i = 0
+    async for percentage in percentages.aiterator(chunk_size=2000):
+        window = min(i * points // total, points - 1)
+        sums[window] += percentage
+        counts[window] += 1
+        i += 1
+        last[window] = i
+
+    windows = [w for w in range(points) if counts[w]]
+    return [last[w] for w in windows], [sums[w] / counts[w] for w in windows]
@@ -0,0 +1,138 @@
+import json
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, leaderboard, stats
+from .models import Score, Subject
+
+
+CHUNK_SIZE = 1000
+MAX_ATTEMPTS = 20000
+
+
+def parse_attempt(text):
+    """One NDJSON line as ``(attempt_id, username, subject, score, total,
+    percentage, date)``, or raise ValueError saying what is wrong with it.
+
+    ``percentage`` is worked out from the score when it is left out, and
+    ``date`` may be naive, as quizify writes it, in which case it is taken
+    to be in the server's time zone.
+    """
+    try:
+        row = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'invalid JSON: {e}')
+    if not isinstance(row, dict):
+        raise ValueError('expected an object')
+
+    try:
+        attempt_id = uuid.UUID(str(row.get('attempt_id')))
+    except ValueError:
+        raise ValueError('attempt_id must be a UUID')
+    username, subject = row.get('username'), row.get('subject')
+    if not isinstance(username, str) or not username:
+        raise ValueError('username is missing')
+    if not isinstance(subject, str) or not subject:
+        raise ValueError('subject is missing')
+
+    score, total = row.get('score'), row.get('total')
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (score, total)):
+        raise ValueError('score and total must be integers')
+    if not 0 <= score <= total or total == 0:
+        raise ValueError('score must be between 0 and total, and total above 0')
+    percentage = row.get('percentage', score / total * 100)
+    if not isinstance(percentage, (int, float)) or isinstance(percentage, bool) or not 0 <= percentage <= 100:
+        raise ValueError('percentage must be a number from 0 to 100')
+
+    date = parse_datetime(row['date']) if isinstance(row.get('date'), str) else None
+    if date is None:
+        raise ValueError('date must be an ISO 8601 date and time')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return attempt_id, username, subject, score, total, float(percentage), date
+
+
+def _insert(chunk, user_ids, subjects, errors):
+    existing = set(
+        Score.objects.filter(attempt_id__in=[row[1][0] for row in chunk]).values_list('attempt_id', flat=True)
+    )
+    new = []
+    for line, (attempt_id, username, subject, score, total, percentage, date) in chunk:
+        if attempt_id in existing:
+            continue
+        if username not in user_ids:
+            errors.append((line, f'no user called {username}'))
+            continue
+        if subject not in subjects:
+            errors.append((line, f'no subject called {subject}'))
+            continue
+        existing.add(attempt_id)
+        new.append(Score(
+            attempt_id=attempt_id,
+            user_id=user_ids[username],
+            subject=subject,
+            score=score,
+            total=total,
+            percentage=percentage,
+            date=date,
+        ))
+    # The lookup above ran inside the write transaction, so nothing can
+    # have stored these ids since. Where the backend lets two uploads
+    # overlap, the unique attempt_id fails the later one, which is then
+    # safe to send again.
+    Score.objects.bulk_create(new)
+    return new
+
+
+@transaction.atomic
+def ingest_attempts(lines, chunk_size=CHUNK_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Store the attempts in ``lines`` of NDJSON, skipping any whose
+    ``attempt_id`` is already stored.
+
+    Attempts are inserted ``chunk_size`` at a time, with one query each to
+    look up their users and already-stored ids. Each chunk is then folded
+    into the leaderboard and the score rollups in bulk, so the cost
+    follows the size of the upload rather than of the stored history.
+    Returns ``(created, duplicates, errors)``, ``errors`` listing
+    ``(line, message)`` for the attempts that were left out.
+    """
+    subjects = set(Subject.objects.values_list('name', flat=True))
+    created = read = 0
+    errors = []
+    chunk = []
+    users = {}
+
+    def flush():
+        usernames = {row[1][1] for row in chunk} - users.keys()
+        users.update(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        new = _insert(chunk, users, subjects, errors)
+        leaderboard.record_scores(new)
+        stats.record_scores(new)
+        chunk.clear()
+        return len(new)
+
+    for line, text in enumerate(lines, 1):
+        if isinstance(text, bytes):
+            text = text.decode('utf-8', 'replace')
+        if not text.strip():
+            continue
+        read += 1
+        if read > max_attempts:
+            raise ValueError(f'at most {max_attempts} attempts can be sent at once')
+        try:
+            chunk.append((line, parse_attempt(text)))
+        except ValueError as e:
+            errors.append((line, str(e)))
+        if len(chunk) >= chunk_size:
+            created += flush()
+    if chunk:
+        created += flush()
+
+    if created:
+        caching.bump_on_commit(caching.SCORES)
+    errors.sort(key=lambda error: error[0])
+    return created, read - created - len(errors), errors
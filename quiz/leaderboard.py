@@ -0,0 +1,224 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import caching
+from .live import leaderboard_events
+from .models import LeaderboardEntry, Score, Subject
+
+
+LEADERBOARD_SIZE = 10
+
+
+def record_score(score):
+    """Fold a newly created Score into the user's best entry for its subject.
+
+    If that puts the user on the subject's board, a ``score`` event goes
+    out to leaderboard subscribers once the transaction commits.
+    """
+    improved = LeaderboardEntry.objects.filter(
+        user_id=score.user_id,
+        subject=score.subject,
+        percentage__lt=score.percentage,
+    ).update(score=score.score, total=score.total, percentage=score.percentage, date=score.date)
+
+    if not improved:
+        _, created = LeaderboardEntry.objects.get_or_create(
+            user_id=score.user_id,
+            subject=score.subject,
+            defaults={
+                'score': score.score,
+                'total': score.total,
+                'percentage': score.percentage,
+                'date': score.date,
+            },
+        )
+        if not created:
+            return
+
+    top = (
+        LeaderboardEntry.objects
+        .filter(subject=score.subject)
+        .order_by('-percentage', 'date')
+        .values_list('user_id', flat=True)[:LEADERBOARD_SIZE]
+    )
+    if score.user_id in list(top):
+        transaction.on_commit(partial(leaderboard_events.publish, 'score', {
+            'subject': score.subject,
+            'username': score.user.username,
+            'percentage': score.percentage,
+        }))
+
+
+def _beats(score, entry):
+    # Higher percentage wins; on a tie the earlier attempt keeps the spot.
+    return score.percentage > entry.percentage or (
+        score.percentage == entry.percentage and score.date < entry.date
+    )
+
+
+def record_scores(scores):
+    """Fold a batch of newly created Scores into their users' best entries,
+    reading and writing each affected entry once.
+
+    Unlike ``record_score`` the batch may hold attempts older than the
+    entry they are compared with, as with attempts taken offline, so the
+    date decides ties. Users the batch puts on a subject's board are
+    announced with ``score`` events once the transaction commits.
+    """
+    best = {}
+    for score in scores:
+        key = (score.user_id, score.subject)
+        if key not in best or _beats(score, best[key]):
+            best[key] = score
+    if not best:
+        return
+
+    subjects = {subject for _, subject in best}
+    entries = {
+        (entry.user_id, entry.subject): entry
+        for entry in LeaderboardEntry.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in best},
+            subject__in=subjects,
+        )
+        if (entry.user_id, entry.subject) in best
+    }
+    new, changed = [], []
+    for (user_id, subject), score in best.items():
+        entry = entries.get((user_id, subject))
+        if entry is None:
+            new.append(LeaderboardEntry(
+                user_id=user_id,
+                subject=subject,
+                score=score.score,
+                total=score.total,
+                percentage=score.percentage,
+                date=score.date,
+            ))
+        elif _beats(score, entry):
+            entry.score, entry.total, entry.percentage, entry.date = score.score, score.total, score.percentage, score.date
+            changed.append(entry)
+    LeaderboardEntry.objects.bulk_create(new, batch_size=1000)
+    LeaderboardEntry.objects.bulk_update(changed, ['score', 'total', 'percentage', 'date'], batch_size=1000)
+
+    moved = {(entry.user_id, entry.subject) for entry in new + changed}
+    if not moved:
+        return
+    usernames = dict(User.objects.filter(id__in={user_id for user_id, _ in moved}).values_list('id', 'username'))
+    for subject in sorted({subject for _, subject in moved}):
+        top = (
+            LeaderboardEntry.objects
+            .filter(subject=subject)
+            .order_by('-percentage', 'date')
+            .values_list('user_id', 'percentage')[:LEADERBOARD_SIZE]
+        )
+        for user_id, percentage in top:
+            if (user_id, subject) in moved:
+                transaction.on_commit(partial(leaderboard_events.publish, 'score', {
+                    'subject': subject,
+                    'username': usernames[user_id],
+                    'percentage': percentage,
+                }))
+
+
+def remove_user(user, subjects):
+    """Delete ``user``'s entries for ``subjects``, once their Scores are gone.
+
+    For each subject whose board they were on, a ``remove`` event goes out
+    when the transaction commits, and a ``score`` event for whoever moves
+    up into the last place, so open pages update without reloading.
+    """
+    for subject in subjects:
+        top = list(
+            LeaderboardEntry.objects
+            .filter(subject=subject)
+            .order_by('-percentage', 'date')
+            .values_list('user_id', 'user__username', 'percentage')[:LEADERBOARD_SIZE + 1]
+        )
+        if user.id not in [user_id for user_id, _, _ in top[:LEADERBOARD_SIZE]]:
+            continue
+        transaction.on_commit(partial(leaderboard_events.publish, 'remove', {
+            'subject': subject,
+            'username': user.username,
+        }))
+        others = [row for row in top if row[0] != user.id]
+        if len(others) == LEADERBOARD_SIZE:
+            _, username, percentage = others[-1]
+            transaction.on_commit(partial(leaderboard_events.publish, 'score', {
+                'subject': subject,
+                'username': username,
+                'percentage': percentage,
+            }))
+    LeaderboardEntry.objects.filter(user=user, subject__in=subjects).delete()
+    caching.bump_on_commit(caching.SCORES)
+
+
+def best_scores(scores):
+    """Best attempt per (user, subject) among ``scores``, ranked in SQL."""
+    return (
+        scores
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id'), F('subject')],
+            order_by=[F('percentage').desc(), F('date').asc()],
+        ))
+        .filter(rank=1)
+        .values_list('user_id', 'subject', 'score', 'total', 'percentage', 'date')
+    )
+
+
+@transaction.atomic
+def rebuild(users=None, subjects=None, batch_size=1000):
+    """Recompute LeaderboardEntry from Score, for everyone or only the
+    entries of ``users`` and/or ``subjects``."""
+    scores = Score.objects.all()
+    entries = LeaderboardEntry.objects.all()
+    if users is not None:
+        scores = scores.filter(user__in=users)
+        entries = entries.filter(user__in=users)
+    if subjects is not None:
+        scores = scores.filter(subject__in=subjects)
+        entries = entries.filter(subject__in=subjects)
+
+    entries.delete()
+    created = 0
+    batch = []
+    for user_id, subject, score, total, percentage, date in best_scores(scores).iterator(chunk_size=batch_size):
+        batch.append(LeaderboardEntry(
+            user_id=user_id,
+            subject=subject,
+            score=score,
+            total=total,
+            percentage=percentage,
+            date=date,
+        ))
+        if len(batch) >= batch_size:
+            LeaderboardEntry.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    LeaderboardEntry.objects.bulk_create(batch)
+    caching.bump_on_commit(caching.SCORES)
+    transaction.on_commit(partial(leaderboard_events.publish, 'reset', {
+        'subjects': None if subjects is None else list(subjects),
+    }))
+    return created + len(batch)
+
+
+async def atop_scores(limit=LEADERBOARD_SIZE):
+    """Return ``{subject: [{username, percentage}, ...]}`` with the best
+    ``limit`` players per subject, read straight off the ranking index."""
+    subject_scores = {}
+    async for subject in Subject.objects.order_by('id').values_list('name', flat=True):
+        top = (
+            LeaderboardEntry.objects
+            .filter(subject=subject)
+            .order_by('-percentage', 'date')
+            .values_list('user__username', 'percentage')[:limit]
+        )
+        rows = [{'username': username, 'percentage': percentage} async for username, percentage in top]
+        if rows:
+            subject_scores[subject] = rows
+    return subject_scores
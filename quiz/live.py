@@ -0,0 +1,74 @@
+import asyncio
+import json
+import threading
+
+
+# Events a subscriber may fall behind by before it is told to resync.
+MAX_QUEUED = 32
+
+
+def encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+RESET = encode_event('reset', {})
+
+
+class Broadcaster:
+    """In-process fan-out of server-sent events.
+
+    Each subscriber is a bounded queue owned by the event loop that serves
+    its connection, so an idle connection costs one queue and one waiting
+    task. ``publish`` can be called from any thread: the event is encoded
+    once and handed to each loop, which copies it into its queues. A
+    subscriber that falls ``MAX_QUEUED`` events behind has its backlog
+    replaced by a single ``reset`` event instead of holding up the rest.
+    """
+
+    def __init__(self, max_queued=MAX_QUEUED):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def subscribe(self):
+        """A new queue of events, fed on the running event loop. Pass it
+        to ``unsubscribe`` when the connection closes."""
+        queue = asyncio.Queue(self.max_queued)
+        with self._lock:
+            self._queues.setdefault(asyncio.get_running_loop(), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            for loop, queues in list(self._queues.items()):
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[loop]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._queues.values())
+
+    def publish(self, event, data):
+        message = encode_event(event, data)
+        with self._lock:
+            targets = [(loop, list(queues)) for loop, queues in self._queues.items()]
+        for loop, queues in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, queues, message)
+            except RuntimeError:
+                # The loop has closed; its subscribers are gone with it.
+                pass
+
+
+def _deliver(queues, message):
+    for queue in queues:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+
+
+leaderboard_events = Broadcaster()
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.decorators import async_only_middleware
+
+from quiz import leaderboard, stats
+from quiz.caching import local_caches
+from quiz.generator import questions_per_attempt
+from quiz.middleware import percentiles
+from quiz.models import Score
+from quiz.question_bank import bank
+
+
+PASSWORD = 'bench-password'
+ATTEMPT_FIELD = re.compile(rb'name="attempt" value="([^"]+)"')
+
+
+class InFlight:
+    """Requests currently inside the middleware chain, and the most there
+    have been at once."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+
+in_flight = InFlight()
+
+
+@async_only_middleware
+def count_in_flight(get_response):
+    """Innermost middleware for the run, so ``peak`` counts requests that
+    reached the views at the same time. Anything further out that handled
+    requests one at a time would keep it at 1."""
+    async def middleware(request):
+        in_flight.current += 1
+        in_flight.peak = max(in_flight.peak, in_flight.current)
+        try:
+            return await get_response(request)
+        finally:
+            in_flight.current -= 1
+    return middleware
+
+
+class Session:
+    """One simulated browser: sends requests straight into the ASGI app
+    and keeps its cookies between them."""
+
+    def __init__(self, app):
+        self.app = app
+        self.cookies = SimpleCookie()
+        self.body = b''
+
+    async def request(self, method, path, data=None):
+        body = urlencode(data or {}).encode()
+        path, _, query = path.partition('?')
+        headers = [(b'host', b'testserver')]
+        if self.cookies:
+            cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+            headers.append((b'cookie', cookie.encode()))
+        if method == 'POST':
+            headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+            headers.append((b'content-length', str(len(body)).encode()))
+            if 'csrftoken' in self.cookies:
+                headers.append((b'x-csrftoken', self.cookies['csrftoken'].value.encode()))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': headers,
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+
+        received = False
+        status = None
+        response_headers = []
+        chunks = []
+
+        async def receive():
+            nonlocal received
+            if received:
+                await asyncio.Event().wait()
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = message['headers']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, send)
+        self.body = b''.join(chunks)
+        location = None
+        for name, value in response_headers:
+            name = name.lower()
+            if name == b'set-cookie':
+                self.cookies.load(value.decode())
+            elif name == b'location':
+                location = urlsplit(value.decode()).path
+        return status, location
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and benchmark the quiz flow through the ASGI app.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Users to seed.')
+        parser.add_argument('--subjects', type=int, default=4, help='Extra subjects to seed.')
+        parser.add_argument('--questions', type=int, default=100, help='Questions per seeded subject.')
+        parser.add_argument('--scores', type=int, default=20000, help='Score rows to seed.')
+        parser.add_argument('--clients', type=int, default=10, help='Concurrent simulated clients.')
+        parser.add_argument('--rounds', type=int, default=5, help='Quiz flows per client.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='bench_output.json', help='Where to write the JSON results.')
+
+    def handle(self, *args, **options):
+        # The run's payloads and version tokens come from the throwaway
+        # database, so they must stay out of the site's caches.
+        with override_settings(
+            CACHES=local_caches(),
+            MIDDLEWARE=[*settings.MIDDLEWARE, f'{__name__}.count_in_flight'],
+        ):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        old_name = connection.settings_dict['NAME']
+        old_test = connection.settings_dict['TEST']
+        # A file rather than SQLite's shared in-memory database, which locks
+        # whole tables and would fail concurrent requests instead of waiting.
+        workdir = tempfile.mkdtemp(prefix='quiz-bench-')
+        connection.settings_dict['TEST'] = {**old_test, 'NAME': os.path.join(workdir, 'bench.sqlite3')}
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.stdout.write('Seeding...')
+                self.seed(rng, options)
+                self.stdout.write('Running...')
+                results = asyncio.run(self.run(rng, options, bank.subjects()))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            connection.settings_dict['TEST'] = old_test
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.report(results)
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+    def seed(self, rng, options):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username=f'bench{i}', first_name=f'Bench {i}', password=password)
+            for i in range(options['users'])
+        ])
+        bank.import_bank({
+            f'Subject {s}': [
+                {'question': f'Question {q}', 'options': ['A', 'B', 'C', 'D'], 'correct': rng.randrange(4)}
+                for q in range(options['questions'])
+            ]
+            for s in range(options['subjects'])
+        })
+
+        user_ids = list(User.objects.values_list('id', flat=True))
+        subjects = bank.subjects()
+        batch = []
+        for _ in range(options['scores']):
+            total = rng.randint(5, 20)
+            score = rng.randint(0, total)
+            batch.append(Score(
+                user_id=rng.choice(user_ids),
+                subject=rng.choice(subjects),
+                score=score,
+                total=total,
+                percentage=score / total * 100,
+            ))
+        Score.objects.bulk_create(batch, batch_size=1000)
+        leaderboard.rebuild()
+        stats.rebuild()
+
+    async def run(self, rng, options, subjects):
+        app = get_asgi_application()
+        usernames = [f'bench{i}' for i in range(options['users'])]
+        answers = questions_per_attempt()
+        timings = {}
+
+        async def timed(session, name, method, path, data=None):
+            started = time.perf_counter()
+            status, location = await session.request(method, path, data)
+            timings.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                raise RuntimeError(f'{method} {path} returned {status}')
+            return location
+
+        async def login(username):
+            session = Session(app)
+            await timed(session, 'login GET', 'GET', '/')
+            location = await timed(session, 'login POST', 'POST', '/', {'username': username, 'password': PASSWORD})
+            if location != '/home/':
+                raise RuntimeError(f'Login failed for {username}')
+            return session
+
+        async def quiz_flow(session):
+            for _ in range(options['rounds']):
+                subject = rng.choice(subjects)
+                await timed(session, 'choose_subject', 'GET', '/choose-subject/')
+                await timed(session, 'quiz GET', 'GET', f'/quiz/{subject}/')
+                attempt = ATTEMPT_FIELD.search(session.body).group(1).decode()
+                location = await timed(session, 'quiz POST', 'POST', f'/quiz/{subject}/', {
+                    'attempt': attempt,
+                    **{f'question_{i}': str(rng.randrange(4)) for i in range(answers)},
+                })
+                if location != '/result/':
+                    raise RuntimeError(f'Quiz submission for {subject} was not graded')
+                await timed(session, 'result', 'GET', '/result/')
+                await timed(session, 'leaderboard', 'GET', '/leaderboard/')
+                await timed(session, 'distribution', 'GET', '/distribution/')
+
+        # Logins are dominated by password hashing, so they are timed per
+        # request but kept out of the throughput figure.
+        sessions = await asyncio.gather(*[login(rng.choice(usernames)) for _ in range(options['clients'])])
+        logins = sum(len(timings[name]) for name in ('login GET', 'login POST'))
+        in_flight.peak = 0
+        started = time.perf_counter()
+        await asyncio.gather(*[quiz_flow(session) for session in sessions])
+        elapsed = time.perf_counter() - started
+
+        requests = sum(len(samples) for samples in timings.values()) - logins
+        return {
+            'commit': self.commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'options': {name: options[name] for name in (
+                'users', 'subjects', 'questions', 'scores', 'clients', 'rounds', 'seed',
+            )},
+            'elapsed_s': round(elapsed, 3),
+            'requests': requests,
+            'requests_per_s': round(requests / elapsed, 1),
+            # Above 1 only if requests were actually handled concurrently.
+            'peak_in_flight': in_flight.peak,
+            'endpoints': {
+                name: {
+                    'requests': len(samples),
+                    # Each client waits for its previous response, so this is
+                    # the rate one client sees, not the server's capacity.
+                    'requests_per_s': round(len(samples) / (sum(samples) / 1000), 1),
+                    'latency_ms': percentiles(samples),
+                }
+                for name, samples in timings.items()
+            },
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def report(self, results):
+        self.stdout.write(f'{"endpoint":<16}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}')
+        for name, endpoint in results['endpoints'].items():
+            latency = endpoint['latency_ms']
+            self.stdout.write(
+                f'{name:<16}{endpoint["requests"]:>10}{endpoint["requests_per_s"]:>10}'
+                f'{latency["p50"]:>10}{latency["p99"]:>10}'
+            )
+        self.stdout.write(
+            f'{results["requests"]} requests in {results["elapsed_s"]}s: {results["requests_per_s"]} req/s, '
+            f'at most {results["peak_in_flight"]} in flight at once'
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.export import CHUNK_SIZE, FORMATS, export_lines, parse_day, score_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream stored quiz attempts as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--subject', help='Only this subject.')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD).')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_day(options['start'], 'start')
+            end = parse_day(options['end'], 'end')
+        except ValueError as e:
+            raise CommandError(e)
+
+        rows = score_rows(options['subject'], start, end)
+        pieces = export_lines(options['format'], rows, options['chunk_size'])
+        if not options['output']:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
+            return
+        with open(options['output'], 'w', newline='') as f:
+            for piece in pieces:
+                f.write(piece)
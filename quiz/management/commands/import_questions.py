@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.bulk_import import FORMATS, format_for, parse
+from quiz.question_bank import IMPORT_BATCH_SIZE, bank
+
+
+class Command(BaseCommand):
+    help = 'Import questions from a questions.json style file, or from NDJSON or CSV rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='questions.json')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='File format. By default it is taken from the file extension.',
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete the existing questions of every subject found in the file first.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Questions per bulk insert.',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Import nothing if any row is invalid.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_for(path)
+        if fmt is None:
+            raise CommandError(f'Could not tell the format of {path}; pass --format.')
+
+        try:
+            with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+                created, duplicates, errors = bank.import_rows(
+                    parse(f, fmt),
+                    replace=options['replace'],
+                    batch_size=options['batch_size'],
+                    strict=options['strict'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        for line, message in errors:
+            self.stderr.write(f'{line}: {message}')
+        if options['strict'] and errors:
+            raise CommandError(f'{len(errors)} invalid rows; nothing was imported.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} questions, skipped {duplicates} duplicates and {len(errors)} invalid rows.'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from quiz import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the leaderboard table from the full score history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = leaderboard.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboard with {created} entries.'))
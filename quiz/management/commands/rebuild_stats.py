@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from quiz import stats
+from quiz.models import QuestionStats, Subject, SubjectStats, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-subject, per-user and per-question rollups from the full score history.'
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        for subject in Subject.objects.order_by('id').values_list('name', flat=True):
+            stats.rebuild_question_stats(subject)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {SubjectStats.objects.count()} subject, {UserStats.objects.count()} user '
+            f'and {QuestionStats.objects.count()} question rollups.'
+        ))
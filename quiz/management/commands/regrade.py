@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from quiz.regrade import CHUNK_SIZE, regrade
+
+
+class Command(BaseCommand):
+    help = 'Re-grade stored quiz attempts against the current answer keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subjects', nargs='*', help='Subjects to re-grade (default: all).')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        results = regrade(options['subjects'] or None, chunk_size=options['chunk_size'])
+        for subject, (checked, changed) in results.items():
+            self.stdout.write(f'{subject}: {checked} attempts checked, {changed} re-scored')
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+
+# Samples kept per view; percentiles cover roughly the most recent traffic.
+MAX_SAMPLES = 1000
+
+_current = ContextVar('quiz_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def _install_wrapper(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+# Connections are per thread, and async views run their queries in
+# sync_to_async threads, so every new connection gets the wrapper. The
+# context variable carries the request's counters into those threads.
+@receiver(connection_created)
+def _wrap_new_connection(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+class ViewStats:
+    """Recent (wall ms, db ms, queries) samples per view, shared by the
+    threads of this process."""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+
+    def add(self, view, wall, db, queries):
+        with self._lock:
+            samples = self._samples.get(view)
+            if samples is None:
+                samples = self._samples[view] = deque(maxlen=self.max_samples)
+            samples.append((wall, db, queries))
+            self._counts[view] = self._counts.get(view, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def summary(self):
+        with self._lock:
+            snapshot = {view: list(samples) for view, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        summary = {}
+        for view, samples in sorted(snapshot.items()):
+            columns = zip(*samples)
+            summary[view] = {'requests': counts[view], 'sampled': len(samples)}
+            for name, values in zip(('wall_ms', 'db_ms', 'queries'), columns):
+                summary[view][name] = percentiles(values)
+        return summary
+
+
+def percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    result = {f'p{p}': round(values[min(len(values) - 1, len(values) * p // 100)], 2) for p in points}
+    result['max'] = round(values[-1], 2)
+    return result
+
+
+view_stats = ViewStats()
+
+
+def _finish(request, response, metrics):
+    wall = (time.perf_counter() - metrics.started) * 1000
+    db = metrics.db_time * 1000
+    match = request.resolver_match
+    view = f'{request.method} {match.view_name if match else "unresolved"}'
+    view_stats.add(view, wall, db, metrics.queries)
+    response['Server-Timing'] = (
+        f'db;dur={db:.1f};desc="{metrics.queries} queries", '
+        f'app;dur={wall - db:.1f}, total;dur={wall:.1f}'
+    )
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics(get_response):
+    """Time each request and count its queries.
+
+    The totals go out in a ``Server-Timing`` header and into ``view_stats``,
+    which the staff metrics page reports as percentiles per view.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _current.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics)
+    else:
+        def middleware(request):
+            # Connections opened before this module was imported.
+            for connection in connections.all(initialized_only=True):
+                _install_wrapper(connection)
+            metrics = RequestMetrics()
+            token = _current.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics)
+    return middleware
@@ -0,0 +1,43 @@
+import json
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+
+def import_questions_json(apps, schema_editor):
+    Subject = apps.get_model('quiz', 'Subject')
+    Question = apps.get_model('quiz', 'Question')
+    Option = apps.get_model('quiz', 'Option')
+
+    if Subject.objects.exists():
+        return
+
+    try:
+        with open(os.path.join(settings.BASE_DIR, 'questions.json'), 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+
+    for name, entries in data.items():
+        subject = Subject.objects.create(name=name)
+        questions = Question.objects.bulk_create([
+            Question(subject=subject, text=entry['question'], correct=entry['correct'], position=position)
+            for position, entry in enumerate(entries)
+        ])
+        Option.objects.bulk_create([
+            Option(question=question, text=text, position=position)
+            for question, entry in zip(questions, entries)
+            for position, text in enumerate(entry['options'])
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_question_bank'),
+    ]
+
+    operations = [
+        migrations.RunPython(import_questions_json, migrations.RunPython.noop),
+    ]
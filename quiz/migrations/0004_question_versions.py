@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_import_questions_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def backfill_leaderboard(apps, schema_editor):
+    Score = apps.get_model('quiz', 'Score')
+    LeaderboardEntry = apps.get_model('quiz', 'LeaderboardEntry')
+
+    best = (
+        Score.objects
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id'), F('subject')],
+            order_by=[F('percentage').desc(), F('date').asc()],
+        ))
+        .filter(rank=1)
+        .values_list('user_id', 'subject', 'score', 'total', 'percentage', 'date')
+    )
+    LeaderboardEntry.objects.bulk_create(
+        [
+            LeaderboardEntry(user_id=user_id, subject=subject, score=score, total=total, percentage=percentage, date=date)
+            for user_id, subject, score, total, percentage, date in best.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_score_subject_percentage_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=100)),
+                ('score', models.IntegerField()),
+                ('total', models.IntegerField()),
+                ('percentage', models.FloatField()),
+                ('date', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject', '-percentage', 'date'], name='quiz_leaderboard_rank')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'subject'), name='quiz_leaderboard_user_subject')],
+            },
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:37
+
+import django.db.models.deletion
+import quiz.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_stats(apps, schema_editor):
+    Score = apps.get_model('quiz', 'Score')
+    SubjectStats = apps.get_model('quiz', 'SubjectStats')
+    UserStats = apps.get_model('quiz', 'UserStats')
+
+    subject_stats = {}
+    user_stats = {}
+    for user_id, subject, percentage in Score.objects.values_list('user_id', 'subject', 'percentage').iterator():
+        for rollup in (
+            subject_stats.setdefault(subject, SubjectStats(subject=subject, buckets=[0] * 100)),
+            user_stats.setdefault((user_id, subject), UserStats(user_id=user_id, subject=subject, buckets=[0] * 100)),
+        ):
+            rollup.count += 1
+            rollup.total += percentage
+            rollup.sum_squares += percentage * percentage
+            rollup.min = percentage if rollup.min is None else min(rollup.min, percentage)
+            rollup.max = percentage if rollup.max is None else max(rollup.max, percentage)
+            # One bucket per percentage point; 100% shares the last one.
+            rollup.buckets[min(int(percentage), 99)] += 1
+
+    SubjectStats.objects.bulk_create(subject_stats.values())
+    UserStats.objects.bulk_create(user_stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_leaderboard_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('sum_squares', models.FloatField(default=0)),
+                ('min', models.FloatField(null=True)),
+                ('max', models.FloatField(null=True)),
+                ('buckets', models.JSONField(default=quiz.models.empty_buckets)),
+                ('subject', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('sum_squares', models.FloatField(default=0)),
+                ('min', models.FloatField(null=True)),
+                ('max', models.FloatField(null=True)),
+                ('buckets', models.JSONField(default=quiz.models.empty_buckets)),
+                ('subject', models.CharField(max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'subject'), name='quiz_userstats_user_subject')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
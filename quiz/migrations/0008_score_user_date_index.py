@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_score_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['user', 'date'], name='quiz_score_user_date'),
+        ),
+    ]
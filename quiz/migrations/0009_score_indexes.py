@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_score_user_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='score',
+            options={},
+        ),
+        migrations.AlterField(
+            model_name='option',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='options', to='quiz.question'),
+        ),
+        migrations.AlterField(
+            model_name='score',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['user', 'subject'], name='quiz_score_user_subject'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_score_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='score',
+            name='answers',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='score',
+            name='question_ids',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['subject', 'id'], name='quiz_score_subject_id'),
+        ),
+    ]
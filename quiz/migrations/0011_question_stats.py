@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:44
+
+import sys
+from array import array
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The Score blob layout as of this migration: question ids as
+# little-endian int64, choices as int8. Copied rather than imported so
+# later changes to quiz.grading can't change what this migration does.
+def unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def backfill_question_stats(apps, schema_editor):
+    Question = apps.get_model('quiz', 'Question')
+    QuestionStats = apps.get_model('quiz', 'QuestionStats')
+    Score = apps.get_model('quiz', 'Score')
+
+    correct_by_id = dict(Question.objects.values_list('id', 'correct'))
+    rows = {}
+    attempts = Score.objects.filter(answers__isnull=False).values_list('question_ids', 'answers', 'percentage')
+    for question_ids, answers, percentage in attempts.iterator():
+        for question_id, choice in zip(unpack('q', question_ids), unpack('b', answers)):
+            if question_id not in correct_by_id:
+                continue
+            row = rows.setdefault(question_id, QuestionStats(question_id=question_id))
+            row.responses += 1
+            if 0 <= choice <= 3:
+                setattr(row, f'chosen_{choice}', getattr(row, f'chosen_{choice}') + 1)
+            row.score_sum += percentage
+            row.score_sum_squares += percentage * percentage
+            if choice == correct_by_id[question_id]:
+                row.correct_count += 1
+                row.correct_score_sum += percentage
+
+    QuestionStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_score_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='quiz.question')),
+                ('responses', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('chosen_0', models.IntegerField(default=0)),
+                ('chosen_1', models.IntegerField(default=0)),
+                ('chosen_2', models.IntegerField(default=0)),
+                ('chosen_3', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_squares', models.FloatField(default=0)),
+                ('correct_score_sum', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_question_stats, migrations.RunPython.noop),
+    ]
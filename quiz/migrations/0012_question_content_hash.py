@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:59
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+# quiz.bulk_import.content_hash as of this migration. Copied rather than
+# imported so later changes to it can't change what this migration does.
+def content_hash(text, options, correct):
+    payload = json.dumps([text.strip(), [option.strip() for option in options], correct])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Question = apps.get_model('quiz', 'Question')
+    Option = apps.get_model('quiz', 'Option')
+
+    options = {}
+    for question_id, text in Option.objects.order_by('question', 'position').values_list('question_id', 'text').iterator():
+        options.setdefault(question_id, []).append(text)
+    questions = list(Question.objects.only('id', 'text', 'correct'))
+    for question in questions:
+        question.content_hash = content_hash(question.text, options.get(question.id, []), question.correct)
+    Question.objects.bulk_update(questions, ['content_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_question_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'content_hash'], name='quiz_question_subject_hash'),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
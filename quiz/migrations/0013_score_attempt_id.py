@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-16 21:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_question_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='score',
+            name='attempt_id',
+            field=models.UUIDField(null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='score',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:39
+
+import sys
+from array import array
+
+from django.db import migrations, models
+
+
+# The Score blob layout as of this migration: question ids as
+# little-endian int64, choices as int8. Copied rather than imported so
+# later changes to quiz.grading can't change what this migration does.
+def unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def backfill_option_sums(apps, schema_editor):
+    QuestionStats = apps.get_model('quiz', 'QuestionStats')
+    Score = apps.get_model('quiz', 'Score')
+
+    rows = {row.question_id: row for row in QuestionStats.objects.all()}
+    attempts = Score.objects.filter(answers__isnull=False).values_list('question_ids', 'answers', 'percentage')
+    for question_ids, answers, percentage in attempts.iterator():
+        for question_id, choice in zip(unpack('q', question_ids), unpack('b', answers)):
+            row = rows.get(question_id)
+            if row is not None and 0 <= choice <= 3:
+                field = f'chosen_score_sum_{choice}'
+                setattr(row, field, getattr(row, field) + percentage)
+
+    QuestionStats.objects.bulk_update(
+        rows.values(),
+        ['chosen_score_sum_0', 'chosen_score_sum_1', 'chosen_score_sum_2', 'chosen_score_sum_3'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_score_attempt_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstats',
+            name='chosen_score_sum_0',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='chosen_score_sum_1',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='chosen_score_sum_2',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='chosen_score_sum_3',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_option_sums, migrations.RunPython.noop),
+    ]
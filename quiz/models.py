@@ -1,17 +1,251 @@
 # quiz/models.py
+import math
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Score(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    subject = models.CharField(max_length=100)
+    score = models.IntegerField()
+    total = models.IntegerField()
+    percentage = models.FloatField()
+    # A default rather than auto_now_add so ingested attempts keep the
+    # time they were actually taken.
+    date = models.DateTimeField(default=timezone.now)
+    question_ids = models.BinaryField(null=True)
+    answers = models.BinaryField(null=True)
+    # Set by clients that upload attempts taken offline, so a retried
+    # upload doesn't store them twice.
+    attempt_id = models.UUIDField(null=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', '-percentage'], name='quiz_score_subject_pct'),
+            models.Index(fields=['user', 'date'], name='quiz_score_user_date'),
+            models.Index(fields=['user', 'subject'], name='quiz_score_user_subject'),
+            models.Index(fields=['subject', 'id'], name='quiz_score_subject_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.subject} - {self.percentage}%"
+
+class Subject(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    version = models.IntegerField(default=1)
+
+    def __str__(self):
+        return self.name
+
+
+class Question(models.Model):
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='questions')
+    text = models.TextField()
+    correct = models.IntegerField()
+    position = models.IntegerField(default=0)
+    version = models.IntegerField(default=1)
+    # bulk_import.content_hash of the text, options and answer, so imports
+    # can skip questions the subject already has.
+    content_hash = models.CharField(max_length=64, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', 'position'], name='quiz_question_subject_pos'),
+            models.Index(fields=['subject', 'content_hash'], name='quiz_question_subject_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject.name} - {self.text}"
+
+
+class Option(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options', db_index=False)
+    text = models.CharField(max_length=255)
+    position = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'position'], name='quiz_option_question_pos'),
+        ]
+
+    def __str__(self):
+        return self.text
+
+
+class LeaderboardEntry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     subject = models.CharField(max_length=100)
     score = models.IntegerField()
     total = models.IntegerField()
     percentage = models.FloatField()
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField()
 
     class Meta:
-        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'subject'], name='quiz_leaderboard_user_subject'),
+        ]
+        indexes = [
+            models.Index(fields=['subject', '-percentage', 'date'], name='quiz_leaderboard_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.subject} - {self.percentage}%"
+
+
+# One bucket per percentage point, so any whole-number bin width can be
+# served by merging buckets instead of rescanning Score.
+STATS_BUCKETS = 100
+
+
+def empty_buckets():
+    return [0] * STATS_BUCKETS
+
+
+class ScoreStats(models.Model):
+    count = models.IntegerField(default=0)
+    total = models.FloatField(default=0)
+    sum_squares = models.FloatField(default=0)
+    min = models.FloatField(null=True)
+    max = models.FloatField(null=True)
+    buckets = models.JSONField(default=empty_buckets)
+
+    class Meta:
+        abstract = True
+
+    def add(self, percentage):
+        self.count += 1
+        self.total += percentage
+        self.sum_squares += percentage * percentage
+        self.min = percentage if self.min is None else min(self.min, percentage)
+        self.max = percentage if self.max is None else max(self.max, percentage)
+        self.buckets[min(int(percentage), STATS_BUCKETS - 1)] += 1
+
+    def subtract(self, other):
+        """Take out the attempts ``other`` rolled up. ``min`` and ``max``
+        can't be undone from the totals and are left for the caller."""
+        self.count -= other.count
+        self.buckets = [mine - theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        if self.count:
+            self.total -= other.total
+            self.sum_squares -= other.sum_squares
+        else:
+            # Nothing left: drop the rounding residue along with the extremes.
+            self.total = self.sum_squares = 0
+            self.min = self.max = None
+
+    def histogram(self, bin_width):
+        bins = math.ceil(100 / bin_width)
+        counts = [0] * bins
+        for point, count in enumerate(self.buckets):
+            counts[min(point // bin_width, bins - 1)] += count
+        return counts
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    @property
+    def stddev(self):
+        if not self.count:
+            return 0
+        return max(self.sum_squares / self.count - self.mean ** 2, 0) ** 0.5
+
+
+class SubjectStats(ScoreStats):
+    subject = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f"{self.subject} - {self.count} attempts"
+
+
+class UserStats(ScoreStats):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'subject'], name='quiz_userstats_user_subject'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.subject} - {self.count} attempts"
+
+
+class QuestionStats(models.Model):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    responses = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    chosen_0 = models.IntegerField(default=0)
+    chosen_1 = models.IntegerField(default=0)
+    chosen_2 = models.IntegerField(default=0)
+    chosen_3 = models.IntegerField(default=0)
+    # Running sums of the attempt percentage of everyone who answered, and
+    # of those who answered correctly, for the point-biserial correlation.
+    score_sum = models.FloatField(default=0)
+    score_sum_squares = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+    # The same sum split by the option chosen, so a change of correct option
+    # can be applied without rescanning the answers.
+    chosen_score_sum_0 = models.FloatField(default=0)
+    chosen_score_sum_1 = models.FloatField(default=0)
+    chosen_score_sum_2 = models.FloatField(default=0)
+    chosen_score_sum_3 = models.FloatField(default=0)
+
+    def add(self, choice, correct, percentage):
+        self.responses += 1
+        if 0 <= choice <= 3:
+            setattr(self, f'chosen_{choice}', getattr(self, f'chosen_{choice}') + 1)
+            setattr(self, f'chosen_score_sum_{choice}', getattr(self, f'chosen_score_sum_{choice}') + percentage)
+        self.score_sum += percentage
+        self.score_sum_squares += percentage * percentage
+        if correct:
+            self.correct_count += 1
+            self.correct_score_sum += percentage
+
+    def remove(self, choice, correct, percentage):
+        self.responses -= 1
+        if 0 <= choice <= 3:
+            setattr(self, f'chosen_{choice}', getattr(self, f'chosen_{choice}') - 1)
+            setattr(self, f'chosen_score_sum_{choice}', getattr(self, f'chosen_score_sum_{choice}') - percentage)
+        self.score_sum -= percentage
+        self.score_sum_squares -= percentage * percentage
+        if correct:
+            self.correct_count -= 1
+            self.correct_score_sum -= percentage
+        if not self.responses:
+            self.score_sum = self.score_sum_squares = self.correct_score_sum = 0
+            for i in range(4):
+                setattr(self, f'chosen_score_sum_{i}', 0)
+
+    def set_correct(self, correct):
+        """Recount who answered correctly after the key changed to ``correct``."""
+        self.correct_count = getattr(self, f'chosen_{correct}')
+        self.correct_score_sum = getattr(self, f'chosen_score_sum_{correct}')
+
+    @property
+    def chosen(self):
+        return [self.chosen_0, self.chosen_1, self.chosen_2, self.chosen_3]
+
+    @property
+    def correct_rate(self):
+        return self.correct_count / self.responses if self.responses else None
+
+    @property
+    def discrimination(self):
+        """Point-biserial correlation between answering this question
+        correctly and the attempt's overall percentage."""
+        n, n1 = self.responses, self.correct_count
+        if n1 == 0 or n1 == n:
+            return None
+        mean = self.score_sum / n
+        variance = self.score_sum_squares / n - mean ** 2
+        if variance <= 0:
+            return None
+        mean_correct = self.correct_score_sum / n1
+        mean_wrong = (self.score_sum - self.correct_score_sum) / (n - n1)
+        p = n1 / n
+        return (mean_correct - mean_wrong) / variance ** 0.5 * (p * (1 - p)) ** 0.5
 
     def __str__(self):
-        return f"{self.user.username} - {self.subject} - {self.percentage}%"
\ No newline at end of file
+        return f"{self.question} - {self.responses} responses"
@@ -0,0 +1,273 @@
+from django.db import transaction
+from django.db.models import F, Max, Prefetch
+
+from . import caching, stats
+from .bulk_import import RowError, content_hash, rows_from_mapping, validate
+from .grading import AnswerKey
+from .models import Subject, Question, Option
+
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def _as_dict(question):
+    return {
+        'id': question.id,
+        'question': question.text,
+        'options': [option.text for option in question.options.all()],
+        'correct': question.correct,
+        'version': question.version,
+    }
+
+
+def _stats_dict(question):
+    stats = getattr(question, 'stats', None)
+    if stats is None or not stats.responses:
+        return None
+    return {
+        'responses': stats.responses,
+        'correct_rate': stats.correct_rate * 100,
+        'discrimination': stats.discrimination,
+        'chosen': stats.chosen,
+    }
+
+
+def _ordered_questions():
+    return Question.objects.order_by('position', 'id').prefetch_related(
+        Prefetch('options', queryset=Option.objects.order_by('question', 'position'))
+    )
+
+
+def _subject_of(question_id, version):
+    return Question.objects.filter(pk=question_id, version=version).values_list('subject_id', flat=True).first()
+
+
+def _bump_subject(subject_id):
+    Subject.objects.filter(pk=subject_id).update(version=F('version') + 1)
+    caching.bump_on_commit(caching.QUESTIONS)
+
+
+class QuestionBank:
+    """Question bank stored in the Subject/Question/Option tables.
+
+    Reads return the same ``{question, options, correct}`` dicts that
+    questions.json used (plus the row ``id`` and ``version``), and every
+    edit touches only the rows of the question being changed.
+
+    Edits and deletes are compare-and-swap on the question's version: the
+    write only applies if nobody else changed the question since the
+    editor loaded it, so concurrent editors can't silently overwrite each
+    other. Each write also bumps the subject's version, which caches of
+    per-subject data can use to notice the change.
+
+    The reads the async views need also come as ``a``-prefixed coroutines.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def subjects(self):
+        return list(Subject.objects.order_by('id').values_list('name', flat=True))
+
+    async def asubjects(self):
+        return [name async for name in Subject.objects.order_by('id').values_list('name', flat=True)]
+
+    def get(self, subject):
+        try:
+            subject = Subject.objects.get(name=subject)
+        except Subject.DoesNotExist:
+            return None
+        return [_as_dict(q) for q in _ordered_questions().filter(subject=subject)]
+
+    def questions(self, question_ids):
+        """The questions with ``question_ids``, in that order, skipping any
+        that no longer exist."""
+        found = {q.id: q for q in _ordered_questions().filter(id__in=question_ids).order_by()}
+        return [_as_dict(found[i]) for i in question_ids if i in found]
+
+    async def aquestions(self, question_ids):
+        found = {q.id: q async for q in _ordered_questions().filter(id__in=question_ids).order_by()}
+        return [_as_dict(found[i]) for i in question_ids if i in found]
+
+    def answer_key(self, subject):
+        """The compiled AnswerKey for ``subject``, or None if it doesn't exist.
+
+        Keys are cached per worker against the subject's version, so after
+        the first submission grading costs one indexed lookup.
+        """
+        row = Subject.objects.filter(name=subject).values_list('id', 'version').first()
+        if row is None:
+            return None
+
+        cached = self._keys.get(subject)
+        if cached is not None and cached[0] == row:
+            return cached[1]
+
+        ids_and_correct = list(
+            Question.objects.filter(subject_id=row[0]).order_by('position', 'id').values_list('id', 'correct')
+        )
+        key = AnswerKey([q for q, _ in ids_and_correct], [c for _, c in ids_and_correct])
+        self._keys[subject] = (row, key)
+        return key
+
+    def all(self, with_stats=False):
+        """Every subject's questions. ``with_stats`` adds each question's
+        answer statistics under ``stats`` (None until it has been answered)."""
+        questions = {name: [] for name in self.subjects()}
+        rows = _ordered_questions().order_by('subject', 'position', 'id').select_related('subject')
+        if with_stats:
+            rows = rows.select_related('stats')
+        for question in rows:
+            entry = _as_dict(question)
+            if with_stats:
+                entry['stats'] = _stats_dict(question)
+            questions[question.subject.name].append(entry)
+        return questions
+
+    def __contains__(self, subject):
+        return Subject.objects.filter(name=subject).exists()
+
+    async def acontains(self, subject):
+        return await Subject.objects.filter(name=subject).aexists()
+
+    @transaction.atomic
+    def add(self, subject, text, options, correct):
+        try:
+            subject = Subject.objects.get(name=subject)
+        except Subject.DoesNotExist:
+            return None
+        last = subject.questions.aggregate(last=Max('position'))['last']
+        question = Question.objects.create(
+            subject=subject,
+            text=text,
+            correct=correct,
+            position=0 if last is None else last + 1,
+            content_hash=content_hash(text, options, correct),
+        )
+        Option.objects.bulk_create([
+            Option(question=question, text=option, position=position)
+            for position, option in enumerate(options)
+        ])
+        _bump_subject(subject.id)
+        return question
+
+    @transaction.atomic
+    def update(self, question_id, version, text, options, correct):
+        current = Question.objects.filter(pk=question_id, version=version).values_list('subject_id', 'correct').first()
+        if current is None:
+            return False
+        subject_id, old_correct = current
+        updated = Question.objects.filter(pk=question_id, version=version).update(
+            text=text,
+            correct=correct,
+            version=F('version') + 1,
+            content_hash=content_hash(text, options, correct),
+        )
+        if not updated:
+            return False
+        Option.objects.filter(question_id=question_id).delete()
+        Option.objects.bulk_create([
+            Option(question_id=question_id, text=option, position=position)
+            for position, option in enumerate(options)
+        ])
+        if correct != old_correct:
+            stats.change_correct(question_id, correct)
+        _bump_subject(subject_id)
+        return True
+
+    @transaction.atomic
+    def delete(self, question_id, version):
+        subject_id = _subject_of(question_id, version)
+        if subject_id is None:
+            return False
+        deleted, _ = Question.objects.filter(pk=question_id, version=version).delete()
+        if not deleted:
+            return False
+        _bump_subject(subject_id)
+        return True
+
+    @transaction.atomic
+    def import_rows(self, rows, replace=False, batch_size=IMPORT_BATCH_SIZE, strict=False):
+        """Import the ``(line, subject, entry)`` rows bulk_import.parse yields.
+
+        Each row is validated as it is read and the questions are written
+        ``batch_size`` at a time with bulk inserts, all in one transaction.
+        A question the subject already has, or that came earlier in the
+        file, is recognised by its content hash and skipped. ``replace``
+        clears a subject's questions the first time the subject appears.
+
+        Returns ``(created, duplicates, errors)``, where ``errors`` lists
+        ``(line, message)`` for the rows that were left out. With
+        ``strict`` any error rolls the whole import back.
+        """
+        subjects = {}
+        pending = []
+        created = duplicates = 0
+        errors = []
+
+        def flush():
+            questions = Question.objects.bulk_create([question for question, _ in pending])
+            Option.objects.bulk_create([
+                Option(question=question, text=text, position=position)
+                for question, (_, options) in zip(questions, pending)
+                for position, text in enumerate(options)
+            ])
+            pending.clear()
+
+        for line, name, entry in rows:
+            try:
+                if isinstance(entry, RowError):
+                    raise entry
+                entry = validate(name, entry)
+            except ValueError as e:
+                errors.append((line, str(e)))
+                continue
+
+            name = name.strip()
+            state = subjects.get(name)
+            if state is None:
+                subject, _ = Subject.objects.get_or_create(name=name)
+                if replace:
+                    subject.questions.all().delete()
+                last = subject.questions.aggregate(last=Max('position'))['last']
+                hashes = set(subject.questions.values_list('content_hash', flat=True))
+                state = subjects[name] = [subject, 0 if last is None else last + 1, hashes]
+            subject, position, hashes = state
+
+            digest = content_hash(entry['question'], entry['options'], entry['correct'])
+            if digest in hashes:
+                duplicates += 1
+                continue
+            hashes.add(digest)
+            state[1] += 1
+            pending.append((Question(
+                subject=subject,
+                text=entry['question'],
+                correct=entry['correct'],
+                position=position,
+                content_hash=digest,
+            ), entry['options']))
+            created += 1
+            if len(pending) >= batch_size:
+                flush()
+
+        if strict and errors:
+            transaction.set_rollback(True)
+            return 0, duplicates, errors
+        if pending:
+            flush()
+        for subject, _, _ in subjects.values():
+            _bump_subject(subject.id)
+        return created, duplicates, errors
+
+    def import_bank(self, data, replace=False):
+        """Load a ``{subject: [{question, options, correct}, ...]}`` mapping.
+        Returns how many questions were created."""
+        created, _, errors = self.import_rows(rows_from_mapping(data), replace=replace, strict=True)
+        if errors:
+            line, message = errors[0]
+            raise ValueError(f'{line}: {message}')
+        return created
+
+
+bank = QuestionBank()
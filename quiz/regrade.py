@@ -0,0 +1,82 @@
+from django.db import transaction
+
+from . import leaderboard, stats
+from .grading import UNANSWERED, grade_packed, pack_answers, unpack_answers, unpack_question_ids
+from .models import Question, Score, Subject
+
+
+CHUNK_SIZE = 2000
+
+
+def _packed_attempt(question_ids, answers, correct_by_id):
+    # The attempt's key and answers over the questions that still exist;
+    # deleted questions no longer count towards it.
+    kept = [i for i, question_id in enumerate(question_ids) if question_id in correct_by_id]
+    key = pack_answers([correct_by_id[question_ids[i]] for i in kept])
+    chosen = pack_answers([answers[i] if i < len(answers) else UNANSWERED for i in kept])
+    return key, chosen
+
+
+def regrade_subject(subject, chunk_size=CHUNK_SIZE):
+    """Re-grade every stored attempt of ``subject`` against the current key.
+
+    Attempts are read in primary-key order, ``chunk_size`` at a time, and
+    each chunk is graded in one pass over its packed keys and answers.
+    Nothing outlives a chunk, so memory is bounded by ``chunk_size``
+    however long the history is. Each chunk's changes are written in
+    their own transaction, so writers are never held up for longer than
+    one chunk. Returns ``(checked, changed)``.
+    """
+    correct_by_id = dict(
+        Question.objects.filter(subject__name=subject).values_list('id', 'correct')
+    )
+    checked = changed = 0
+    last_id = 0
+
+    while True:
+        chunk = list(
+            Score.objects
+            .filter(subject=subject, id__gt=last_id, answers__isnull=False)
+            .order_by('id')
+            .values_list('id', 'question_ids', 'answers', 'score', 'total')[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        checked += len(chunk)
+
+        pairs = [
+            _packed_attempt(unpack_question_ids(question_ids), unpack_answers(answers), correct_by_id)
+            for _, question_ids, answers, _, _ in chunk
+        ]
+        updates = []
+        for (pk, _, _, old_score, old_total), (key, _), score in zip(chunk, pairs, grade_packed(pairs)):
+            total = len(key)
+            if (score, total) != (old_score, old_total):
+                percentage = (score / total * 100) if total > 0 else 0
+                updates.append(Score(id=pk, score=score, total=total, percentage=percentage))
+
+        if updates:
+            Score.objects.bulk_update(updates, ['score', 'total', 'percentage'], batch_size=chunk_size)
+            changed += len(updates)
+
+    return checked, changed
+
+
+def regrade(subjects=None, chunk_size=CHUNK_SIZE):
+    """Re-grade ``subjects`` (default: all) and refresh the tables derived
+    from Score, including per-question statistics, for any subject whose
+    scores changed."""
+    if subjects is None:
+        subjects = list(Subject.objects.order_by('id').values_list('name', flat=True))
+
+    results = {}
+    for subject in subjects:
+        checked, changed = regrade_subject(subject, chunk_size)
+        if changed:
+            with transaction.atomic():
+                leaderboard.rebuild(subjects=[subject])
+                stats.rebuild(subjects=[subject])
+                stats.rebuild_question_stats(subject, chunk_size)
+        results[subject] = (checked, changed)
+    return results
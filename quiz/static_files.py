@@ -0,0 +1,71 @@
+import asyncio
+
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.string_utils import decode_path_info
+
+
+# Bytes read from disk per ASGI body message.
+CHUNK_SIZE = 64 * 1024
+
+
+class StaticFiles:
+    """ASGI wrapper that answers static file requests before Django.
+
+    WhiteNoise's Django middleware is sync-only, and one sync middleware
+    makes Django hold a thread for the whole of every request, async views
+    included. This keeps WhiteNoise's file index and headers (same settings
+    as the middleware) but serves the files here, reading them on the
+    default executor, so every middleware Django loads can stay async.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.whitenoise = WhiteNoiseMiddleware()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            static_file = self.find(scope['path'])
+            if static_file is not None:
+                return await self.serve(static_file, scope, send)
+        return await self.application(scope, receive, send)
+
+    def find(self, path):
+        if self.whitenoise.autorefresh:
+            return self.whitenoise.find_file(path)
+        return self.whitenoise.files.get(path)
+
+    async def serve(self, static_file, scope, send):
+        # WhiteNoise reads conditional and range headers from WSGI-style keys.
+        request_headers = {
+            'HTTP_' + name.decode('latin-1').upper().replace('-', '_'): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        response = await asyncio.to_thread(static_file.get_response, scope['method'], request_headers)
+        await send({
+            'type': 'http.response.start',
+            'status': int(response.status),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        if response.file is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        try:
+            while True:
+                chunk = await asyncio.to_thread(response.file.read, CHUNK_SIZE)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': bool(chunk)})
+                if not chunk:
+                    break
+        finally:
+            await asyncio.to_thread(response.file.close)
+
+
+class WSGIStaticFiles(StaticFiles):
+    """The same wrapper for the WSGI application, so deployments that run
+    wsgi.py still get static files once WhiteNoise is out of MIDDLEWARE."""
+
+    def __call__(self, environ, start_response):
+        static_file = self.find(decode_path_info(environ.get('PATH_INFO', '')))
+        if static_file is None:
+            return self.application(environ, start_response)
+        return WhiteNoise.serve(static_file, environ, start_response)
@@ -0,0 +1,264 @@
+import math
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Least
+
+from . import caching
+from .grading import unpack_answers, unpack_question_ids
+from .models import Question, QuestionStats, Score, SubjectStats, UserStats
+
+
+DEFAULT_BIN_WIDTH = 10
+
+
+def bucket_labels(bin_width):
+    bins = math.ceil(100 / bin_width)
+    return [f'{i * bin_width}-{min((i + 1) * bin_width, 100)}' for i in range(bins)]
+
+
+def _bucket_counts(scores, group_by, bin_width):
+    bins = math.ceil(100 / bin_width)
+    rows = (
+        scores
+        .annotate(bucket=Least(
+            Cast(F('percentage') / bin_width, IntegerField()),
+            Value(bins - 1),
+        ))
+        .values_list(*group_by, 'bucket')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    histogram = {}
+    for *key, bucket, count in rows:
+        histogram.setdefault(tuple(key), [0] * bins)[bucket] += count
+    return histogram
+
+
+def record_score(score):
+    """Add a newly created Score to its subject and user rollups."""
+    subject_stats, _ = SubjectStats.objects.select_for_update().get_or_create(subject=score.subject)
+    subject_stats.add(score.percentage)
+    subject_stats.save()
+
+    user_stats, _ = UserStats.objects.select_for_update().get_or_create(user_id=score.user_id, subject=score.subject)
+    user_stats.add(score.percentage)
+    user_stats.save()
+
+
+ROLLUP_FIELDS = ['count', 'total', 'sum_squares', 'min', 'max', 'buckets']
+
+
+def record_scores(scores):
+    """Add a batch of newly created Scores to their subject and user
+    rollups, reading and writing each affected rollup row once."""
+    subjects = {score.subject for score in scores}
+    keys = {(score.user_id, score.subject) for score in scores}
+    subject_rows = {row.subject: row for row in SubjectStats.objects.select_for_update().filter(subject__in=subjects)}
+    user_rows = {
+        (row.user_id, row.subject): row
+        for row in UserStats.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in keys},
+            subject__in=subjects,
+        )
+        if (row.user_id, row.subject) in keys
+    }
+    changed_subjects, changed_users = list(subject_rows.values()), list(user_rows.values())
+    new_subjects, new_users = [], []
+
+    for score in scores:
+        subject_stats = subject_rows.get(score.subject)
+        if subject_stats is None:
+            subject_stats = subject_rows[score.subject] = SubjectStats(subject=score.subject)
+            new_subjects.append(subject_stats)
+        subject_stats.add(score.percentage)
+
+        key = (score.user_id, score.subject)
+        user_stats = user_rows.get(key)
+        if user_stats is None:
+            user_stats = user_rows[key] = UserStats(user_id=score.user_id, subject=score.subject)
+            new_users.append(user_stats)
+        user_stats.add(score.percentage)
+
+    SubjectStats.objects.bulk_create(new_subjects)
+    SubjectStats.objects.bulk_update(changed_subjects, ROLLUP_FIELDS)
+    UserStats.objects.bulk_create(new_users, batch_size=1000)
+    UserStats.objects.bulk_update(changed_users, ROLLUP_FIELDS, batch_size=1000)
+
+
+def remove_user(user):
+    """Take ``user``'s rollups out of their subjects' rollups and delete
+    them, once the user's Scores are gone.
+
+    Counts, sums and buckets are subtracted. Min and max are re-read from
+    the remaining scores, and only for subjects where the user held one.
+    """
+    user_rows = list(UserStats.objects.select_for_update().filter(user=user))
+    subject_rows = SubjectStats.objects.select_for_update().in_bulk(
+        [row.subject for row in user_rows], field_name='subject',
+    )
+    stale = []
+    for user_stats in user_rows:
+        subject_stats = subject_rows.get(user_stats.subject)
+        if subject_stats is None:
+            continue
+        held_extreme = user_stats.min == subject_stats.min or user_stats.max == subject_stats.max
+        subject_stats.subtract(user_stats)
+        if held_extreme and subject_stats.count:
+            stale.append(subject_stats)
+
+    if stale:
+        extremes = {
+            subject: (low, high)
+            for subject, low, high in Score.objects
+            .filter(subject__in=[row.subject for row in stale])
+            .values_list('subject')
+            .annotate(Min('percentage'), Max('percentage'))
+            .order_by()
+        }
+        for subject_stats in stale:
+            subject_stats.min, subject_stats.max = extremes[subject_stats.subject]
+
+    SubjectStats.objects.bulk_update(subject_rows.values(), ROLLUP_FIELDS)
+    UserStats.objects.filter(user=user).delete()
+    caching.bump_on_commit(caching.SCORES)
+
+
+def _rollups(scores, group_by):
+    totals = (
+        scores
+        .values_list(*group_by)
+        .annotate(
+            count=Count('id'),
+            total=Sum('percentage'),
+            sum_squares=Sum(F('percentage') * F('percentage')),
+            min=Min('percentage'),
+            max=Max('percentage'),
+        )
+        .order_by()
+    )
+    buckets = _bucket_counts(scores, group_by, 1)
+    for *key, count, total, sum_squares, low, high in totals:
+        key = tuple(key)
+        yield key, {
+            'count': count,
+            'total': total,
+            'sum_squares': sum_squares,
+            'min': low,
+            'max': high,
+            'buckets': buckets[key],
+        }
+
+
+@transaction.atomic
+def rebuild(subjects=None, users=None):
+    """Recompute the rollups from Score.
+
+    With no arguments every rollup is rebuilt. ``subjects`` limits the
+    rebuild to those subjects' rollups (subject and user), and ``users``
+    limits the user rollups to those users.
+    """
+    subject_scores = user_scores = Score.objects.all()
+    subject_rollups = SubjectStats.objects.all()
+    user_rollups = UserStats.objects.all()
+    if subjects is not None:
+        subject_scores = subject_scores.filter(subject__in=subjects)
+        user_scores = user_scores.filter(subject__in=subjects)
+        subject_rollups = subject_rollups.filter(subject__in=subjects)
+        user_rollups = user_rollups.filter(subject__in=subjects)
+    if users is not None:
+        user_scores = user_scores.filter(user__in=users)
+        user_rollups = user_rollups.filter(user__in=users)
+
+    subject_rollups.delete()
+    user_rollups.delete()
+    SubjectStats.objects.bulk_create([
+        SubjectStats(subject=subject, **values)
+        for (subject,), values in _rollups(subject_scores, ['subject'])
+    ])
+    UserStats.objects.bulk_create([
+        UserStats(user_id=user_id, subject=subject, **values)
+        for (user_id, subject), values in _rollups(user_scores, ['user_id', 'subject'])
+    ], batch_size=1000)
+    caching.bump_on_commit(caching.SCORES)
+
+
+QUESTION_STATS_FIELDS = [
+    'responses', 'correct_count', 'chosen_0', 'chosen_1', 'chosen_2', 'chosen_3',
+    'score_sum', 'score_sum_squares', 'correct_score_sum',
+    'chosen_score_sum_0', 'chosen_score_sum_1', 'chosen_score_sum_2', 'chosen_score_sum_3',
+]
+
+
+def record_answers(key, answers, percentage):
+    """Add one graded attempt to the QuestionStats of every question in ``key``."""
+    question_ids = list(key.question_ids)
+    rows = {s.question_id: s for s in QuestionStats.objects.select_for_update().filter(question_id__in=question_ids)}
+    missing = [q for q in question_ids if q not in rows]
+    if missing:
+        # Only questions that still exist can get a stats row.
+        new_rows = [QuestionStats(question_id=q) for q in Question.objects.filter(id__in=missing).values_list('id', flat=True)]
+        rows.update((row.question_id, row) for row in new_rows)
+    else:
+        new_rows = []
+
+    for question_id, correct, choice in zip(question_ids, key.correct, answers):
+        row = rows.get(question_id)
+        if row is not None:
+            row.add(choice, choice == correct, percentage)
+
+    created = {row.question_id for row in new_rows}
+    QuestionStats.objects.bulk_create(new_rows)
+    QuestionStats.objects.bulk_update(
+        [row for q, row in rows.items() if q not in created],
+        QUESTION_STATS_FIELDS,
+    )
+
+
+def remove_answers(attempts):
+    """Take graded attempts, as packed ``(question_ids, answers,
+    percentage)`` read off their Scores, back out of QuestionStats."""
+    attempts = [
+        (unpack_question_ids(question_ids), unpack_answers(answers), percentage)
+        for question_ids, answers, percentage in attempts
+    ]
+    question_ids = {question_id for ids, _, _ in attempts for question_id in ids}
+    correct_by_id = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'correct'))
+    rows = {s.question_id: s for s in QuestionStats.objects.select_for_update().filter(question_id__in=question_ids)}
+
+    for ids, answers, percentage in attempts:
+        for question_id, choice in zip(ids, answers):
+            row = rows.get(question_id)
+            if row is not None:
+                row.remove(choice, choice == correct_by_id[question_id], percentage)
+
+    QuestionStats.objects.bulk_update(rows.values(), QUESTION_STATS_FIELDS, batch_size=1000)
+
+
+def change_correct(question_id, correct):
+    """Update a question's counters after its correct option changed."""
+    row = QuestionStats.objects.select_for_update().filter(question_id=question_id).first()
+    if row is not None:
+        row.set_correct(correct)
+        row.save(update_fields=['correct_count', 'correct_score_sum'])
+
+
+@transaction.atomic
+def rebuild_question_stats(subject, chunk_size=2000):
+    """Recompute QuestionStats for ``subject`` from the stored answers."""
+    correct_by_id = dict(Question.objects.filter(subject__name=subject).values_list('id', 'correct'))
+    rows = {question_id: QuestionStats(question_id=question_id) for question_id in correct_by_id}
+
+    attempts = (
+        Score.objects
+        .filter(subject=subject, answers__isnull=False)
+        .values_list('question_ids', 'answers', 'percentage')
+    )
+    for question_ids, answers, percentage in attempts.iterator(chunk_size=chunk_size):
+        for question_id, choice in zip(unpack_question_ids(question_ids), unpack_answers(answers)):
+            if question_id in rows:
+                rows[question_id].add(choice, choice == correct_by_id[question_id], percentage)
+
+    QuestionStats.objects.filter(question__in=list(rows)).delete()
+    QuestionStats.objects.bulk_create(rows.values(), batch_size=1000)
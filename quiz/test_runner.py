@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .caching import local_caches
+
+
+class QuizTestRunner(DiscoverRunner):
+    """Runs the suite with in-process caches, so tests never see or clear
+    the payloads and sessions of the site they are run next to."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=local_caches())
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
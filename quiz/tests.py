@@ -1,3 +1,882 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import math
+import random
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+
+from . import leaderboard, stats
+from .attempts import clear_attempts, record_attempt
+from .bulk_import import parse
+from .generator import questions_per_attempt, sample_questions
+from .grading import UNANSWERED, AnswerKey, answers_from_form, grade_packed, pack_answers
+from .history import MAX_CHART_POINTS, MAX_PAGE_SIZE, ascore_series, score_page
+from .ingest import ingest_attempts
+from .live import Broadcaster, leaderboard_events
+from .middleware import view_stats
+from .models import LeaderboardEntry, QuestionStats, Score, Subject, SubjectStats, UserStats
+from .question_bank import bank
+from .regrade import regrade
+from .static_files import StaticFiles, WSGIStaticFiles
+from .stats import rebuild_question_stats
+
+
+# Tables with one row per subject; reading all of them is the point.
+SMALL_TABLES = {'quiz_subject', 'quiz_subjectstats'}
+
+
+class QueryPlanTests(TestCase):
+    """Every query a page runs must be answered from an index.
+
+    Each view is requested against a seeded database and the plan of every
+    query it issues is checked with ``EXPLAIN QUERY PLAN``. A full scan of
+    a large table or a sort through a temporary B-tree fails the test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1)
+        cls.user = User.objects.create_user('alice', password='Secret123', first_name='Alice')
+        users = [cls.user] + [User.objects.create_user(f'user{i}') for i in range(20)]
+        for _ in range(500):
+            record_attempt(
+                rng.choice(users),
+                rng.choice(['Python', 'Java', 'C', 'C#']),
+                3, 5,
+                rng.random() * 100,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def plan_problems(self, path, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+
+        problems = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if 'TEMP B-TREE' in detail:
+                        problems.append((detail, query['sql']))
+                    elif detail.startswith('SCAN ') and detail.split()[1] not in SMALL_TABLES:
+                        problems.append((detail, query['sql']))
+        return problems
+
+    def assertIndexedQueries(self, path, **params):
+        problems = self.plan_problems(path, **params)
+        self.assertEqual(problems, [], f'{path} ran unindexed queries')
+
+    def test_choose_subject(self):
+        self.assertIndexedQueries('/choose-subject/')
+
+    def test_quiz(self):
+        self.assertIndexedQueries('/quiz/Python/')
+
+    def test_leaderboard(self):
+        self.assertIndexedQueries('/leaderboard/')
+
+    def test_distribution(self):
+        self.assertIndexedQueries('/distribution/')
+        self.assertIndexedQueries('/distribution/', bin=5)
+
+    def test_my_scores(self):
+        self.assertIndexedQueries('/my-scores/')
+
+    def test_my_scores_history(self):
+        response = self.client.get('/my-scores/history/', {'limit': 5})
+        self.assertIndexedQueries('/my-scores/history/', cursor=response.json()['next'])
+
+    def test_manage_users(self):
+        self.assertIndexedQueries('/manage-users/')
+
+
+class GradingTests(SimpleTestCase):
+    def test_grade_matches_question_by_question_comparison(self):
+        rng = random.Random(2)
+        key = AnswerKey(range(200), [rng.randrange(4) for _ in range(200)])
+        attempts = [[rng.randrange(-1, 4) for _ in range(200)] for _ in range(50)]
+
+        expected = [sum(a == c for a, c in zip(answers, key.correct)) for answers in attempts]
+        self.assertEqual([key.grade(answers) for answers in attempts], expected)
+        self.assertEqual(key.grade_many(attempts), expected)
+
+    def test_short_and_empty_answer_vectors(self):
+        key = AnswerKey([1, 2, 3], [1, 0, 3])
+        self.assertEqual(key.grade_many([[1, 0, 3], [1], []]), [3, 1, 0])
+        self.assertEqual(AnswerKey([], []).grade([]), 0)
+
+    def test_grade_packed_mixes_keys(self):
+        pairs = [(pack_answers([1, 2, 3]), pack_answers([1, 0, 3])), (b'', b''), (pack_answers([0]), pack_answers([0]))]
+        self.assertEqual(grade_packed(pairs), [2, 0, 1])
+
+    def test_answers_from_form_ignores_bad_values(self):
+        answers = answers_from_form({'question_0': '2', 'question_1': 'x', 'question_2': '-1', 'question_3': '²'}, 5)
+        self.assertEqual(list(answers), [2, UNANSWERED, UNANSWERED, UNANSWERED, UNANSWERED])
+
+
+@contextmanager
+def published_events():
+    """Collect the events published to leaderboard subscribers instead of
+    sending them."""
+    events = []
+    with mock.patch.object(leaderboard_events, 'publish', side_effect=lambda event, data: events.append((event, data))):
+        yield events
+
+
+def take_quiz(client, subject, choose):
+    """Open ``subject``'s quiz and submit ``choose(question)`` (an original
+    option index, or None to skip) for each question that was drawn."""
+    attempt = client.get(f'/quiz/{subject}/').context['attempt']
+    selection = client.session['quiz_selection'][attempt]
+    questions = bank.questions(selection['questions'])
+    data = {'attempt': attempt}
+    for i, (question, order) in enumerate(zip(questions, selection['orders'])):
+        choice = choose(question)
+        if choice is not None:
+            data[f'question_{i}'] = str(order.index(str(choice)))
+    return client.post(f'/quiz/{subject}/', data)
+
+
+class RegradeTests(TestCase):
+    def test_regrade_applies_answer_key_edits(self):
+        user = User.objects.create_user('bob', password='Secret123')
+        self.client.force_login(user)
+        questions = bank.get('Python')
+        take_quiz(self.client, 'Python', lambda q: q['correct'])
+        self.assertEqual(Score.objects.get().score, len(questions))
+
+        edited = questions[0]
+        bank.update(edited['id'], edited['version'], edited['question'], edited['options'], (edited['correct'] + 1) % 4)
+        self.assertEqual(regrade(['Python'], chunk_size=1), {'Python': (1, 1)})
+
+        attempt = Score.objects.get()
+        self.assertEqual((attempt.score, attempt.total), (len(questions) - 1, len(questions)))
+        self.assertEqual(LeaderboardEntry.objects.get(user=user).score, len(questions) - 1)
+
+
+class QuestionStatsTests(TestCase):
+    def counters(self):
+        return [
+            (*row[:7], *(round(total, 6) for total in row[7:]))
+            for row in QuestionStats.objects.order_by('pk').values_list(
+                'question_id', 'responses', 'correct_count', 'chosen_0', 'chosen_1', 'chosen_2', 'chosen_3',
+                'correct_score_sum', 'chosen_score_sum_0', 'chosen_score_sum_1', 'chosen_score_sum_2', 'chosen_score_sum_3',
+            )
+        ]
+
+    def test_incremental_counters_match_rebuild(self):
+        rng = random.Random(3)
+        questions = bank.get('Python')
+        for i in range(10):
+            self.client.force_login(User.objects.create_user(f'user{i}'))
+            take_quiz(self.client, 'Python', lambda q: rng.randrange(4) if rng.random() < 0.9 else None)
+
+        incremental = self.counters()
+        self.assertEqual(sum(row[1] for row in incremental), 10 * min(len(questions), questions_per_attempt()))
+        rebuild_question_stats('Python')
+        self.assertEqual(self.counters(), incremental)
+
+    def test_clearing_scores_and_editing_the_key_match_rebuild(self):
+        rng = random.Random(4)
+        users = [User.objects.create_user(f'user{i}') for i in range(4)]
+        for user in users:
+            self.client.force_login(user)
+            take_quiz(self.client, 'Python', lambda q: rng.randrange(4))
+
+        clear_attempts(users[0])
+        edited = bank.get('Python')[0]
+        with CaptureQueriesContext(connection) as ctx:
+            bank.update(edited['id'], edited['version'], edited['question'], edited['options'], (edited['correct'] + 1) % 4)
+        self.assertFalse([q for q in ctx.captured_queries if 'quiz_score' in q['sql']])
+        counters = self.counters()
+        self.assertEqual(sum(row[1] for row in counters), 3 * min(len(bank.get('Python')), questions_per_attempt()))
+        rebuild_question_stats('Python')
+        self.assertEqual(self.counters(), counters)
+
+    def test_discrimination(self):
+        stats = QuestionStats()
+        for choice, percentage in [(0, 90), (0, 80), (1, 40), (2, 30)]:
+            stats.add(choice, choice == 0, percentage)
+        self.assertEqual(stats.chosen, [2, 1, 1, 0])
+        self.assertEqual(stats.correct_rate, 0.5)
+        self.assertAlmostEqual(stats.discrimination, 0.9806, places=4)
+
+
+class GeneratorTests(TestCase):
+    def test_submission_is_graded_against_the_drawn_questions(self):
+        self.client.force_login(User.objects.create_user('carol'))
+        for i in range(30):
+            bank.add('Python', f'Extra {i}', ['a', 'b', 'c', 'd'], i % 4)
+
+        take_quiz(self.client, 'Python', lambda q: q['correct'])
+        attempt = Score.objects.get()
+        self.assertEqual((attempt.score, attempt.total), (questions_per_attempt(), questions_per_attempt()))
+        self.assertEqual(self.client.session['quiz_selection'], {})
+
+    def test_each_open_page_is_graded_against_its_own_draw(self):
+        self.client.force_login(User.objects.create_user('cora'))
+        for i in range(30):
+            bank.add('Python', f'Extra {i}', ['a', 'b', 'c', 'd'], i % 4)
+
+        # An older copy of the page, still open while a newer one is drawn.
+        older = self.client.get('/quiz/Python/').context['attempt']
+        selection = self.client.session['quiz_selection'][older]
+        data = {'attempt': older}
+        for i, (question, order) in enumerate(zip(bank.questions(selection['questions']), selection['orders'])):
+            data[f'question_{i}'] = str(order.index(str(question['correct'])))
+        self.client.get('/quiz/Python/')
+
+        self.client.post('/quiz/Python/', data)
+        self.assertEqual(Score.objects.get().score, questions_per_attempt())
+
+        # The same page can't be submitted twice, nor under another subject.
+        self.client.post('/quiz/Python/', data)
+        newer, = self.client.session['quiz_selection']
+        self.client.post('/quiz/Java/', {'attempt': newer})
+        self.assertEqual(Score.objects.count(), 1)
+
+    def test_stratified_sample_spans_difficulty(self):
+        Subject.objects.create(name='Trivia')
+        ids = [bank.add('Trivia', f'Question {i}', ['a', 'b'], 0).id for i in range(40)]
+        for correct_count, question_id in enumerate(ids):
+            QuestionStats.objects.create(question_id=question_id, responses=40, correct_count=correct_count)
+
+        for seed in range(5):
+            picked = sample_questions('Trivia', 4, rng=random.Random(seed))
+            self.assertEqual(sorted(ids.index(question_id) // 10 for question_id in picked), [0, 1, 2, 3])
+
+
+class SessionQueryTests(TestCase):
+    """The quiz flow's per-request session queries under each session
+    backend the settings can pick."""
+
+    def quiz_flow_queries(self):
+        self.client = self.client_class()
+        self.client.force_login(User.objects.create_user(f'user{User.objects.count()}'))
+        counts = []
+        pages = []
+        for request in (
+            lambda: pages.append(self.client.get('/quiz/Python/')),
+            lambda: self.client.post('/quiz/Python/', {'attempt': pages[0].context['attempt'], 'question_0': '0'}),
+            lambda: self.client.get('/result/'),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                request()
+            counts.append(sum('django_session' in query['sql'] for query in ctx.captured_queries))
+        return counts
+
+    def test_configured_sessions_skip_the_session_table(self):
+        self.assertEqual(self.quiz_flow_queries(), [0, 0, 0])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_sessions_skip_the_session_table(self):
+        self.assertEqual(self.quiz_flow_queries(), [0, 0, 0])
+
+    def test_replayed_session_cannot_submit_twice(self):
+        self.client.force_login(User.objects.create_user('remy'))
+        attempt = self.client.get('/quiz/Python/').context['attempt']
+        # An old copy of the session cookie still holds the selection.
+        stale_cookies = self.client.cookies.output(header='', sep=';')
+        self.client.post('/quiz/Python/', {'attempt': attempt, 'question_0': '0'})
+        self.client.cookies.load(stale_cookies)
+        self.assertIn(attempt, self.client.session['quiz_selection'])
+        self.client.post('/quiz/Python/', {'attempt': attempt, 'question_0': '0'})
+        self.assertEqual(Score.objects.count(), 1)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        view_stats.clear()
+        self.user = User.objects.create_user('dave', password='Secret123')
+
+    def query_count(self, response):
+        timing = response['Server-Timing']
+        return int(timing.split('desc="')[1].split()[0])
+
+    def test_server_timing_counts_queries(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/leaderboard/')
+        self.assertEqual(self.query_count(response), len(ctx.captured_queries))
+
+    async def test_async_requests_are_counted(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get('/leaderboard/')
+        self.assertGreater(self.query_count(response), 0)
+
+    def test_metrics_page_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.client.get('/leaderboard/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        views = self.client.get('/metrics/').json()['views']
+        self.assertEqual(views['GET leaderboard']['requests'], 1)
+        self.assertIn('p99', views['GET leaderboard']['wall_ms'])
+
+    def test_metrics_reset_needs_a_post(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.client.get('/leaderboard/')
+        self.assertEqual(self.client.get('/metrics/reset/').status_code, 405)
+        self.assertIn('GET leaderboard', self.client.get('/metrics/?reset=1').json()['views'])
+
+        self.assertIn('GET leaderboard', self.client.post('/metrics/reset/').json()['views'])
+        self.assertNotIn('GET leaderboard', self.client.get('/metrics/').json()['views'])
+
+
+class AsyncViewTests(TestCase):
+    async def test_read_pages_render_from_the_event_loop(self):
+        user = await User.objects.acreate_user('erin', first_name='Erin')
+        client = AsyncClient()
+        await client.aforce_login(user)
+        for path in ('/choose-subject/', '/quiz/Python/', '/leaderboard/', '/distribution/', '/my-scores/'):
+            response = await client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+        self.assertContains(response, 'Erin')
+        selection, = (await client.session.aget('quiz_selection')).values()
+        self.assertEqual(len(selection['questions']), len(selection['orders']))
+
+    def test_middleware_chain_is_async(self):
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    async def test_static_files_are_served_ahead_of_django(self):
+        async def django_app(scope, receive, send):
+            raise AssertionError(scope['path'])
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/static/quiz/style.css', 'headers': []}
+        await StaticFiles(django_app)(scope, None, send)
+        self.assertEqual(sent[0]['status'], 200)
+        with open(settings.BASE_DIR / 'quiz' / 'static' / 'quiz' / 'style.css', 'rb') as f:
+            self.assertEqual(b''.join(message.get('body', b'') for message in sent[1:]), f.read())
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    def test_static_files_are_served_under_wsgi(self):
+        def django_app(environ, start_response):
+            raise AssertionError(environ['PATH_INFO'])
+
+        statuses = []
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/static/quiz/style.css'}
+        body = WSGIStaticFiles(django_app)(environ, lambda status, headers: statuses.append(status))
+        self.assertEqual(statuses, ['200 OK'])
+        with open(settings.BASE_DIR / 'quiz' / 'static' / 'quiz' / 'style.css', 'rb') as f:
+            self.assertEqual(b''.join(body), f.read())
+        body.close()
+
+
+class LiveLeaderboardTests(TestCase):
+    async def test_publish_from_another_thread_reaches_every_subscriber(self):
+        broadcaster = Broadcaster(max_queued=2)
+        first, second = broadcaster.subscribe(), broadcaster.subscribe()
+        publisher = threading.Thread(target=broadcaster.publish, args=('score', {'n': 1}))
+        publisher.start()
+        publisher.join()
+        for queue in (first, second):
+            message = await asyncio.wait_for(queue.get(), 1)
+            self.assertEqual(message, b'event: score\ndata: {"n":1}\n\n')
+
+        # A subscriber that falls behind gets one reset, not a backlog.
+        for n in range(3):
+            broadcaster.publish('score', {'n': n})
+        await asyncio.sleep(0)
+        self.assertEqual(first.qsize(), 1)
+        self.assertTrue((await first.get()).startswith(b'event: reset'))
+
+        broadcaster.unsubscribe(first)
+        broadcaster.unsubscribe(second)
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+
+    def test_attempt_entering_the_board_is_published_on_commit(self):
+        user = User.objects.create_user('frank')
+        with published_events() as published:
+            with self.captureOnCommitCallbacks(execute=True):
+                record_attempt(user, 'Python', 4, 5, 80.0)
+                self.assertEqual(published, [])
+            with self.captureOnCommitCallbacks(execute=True):
+                record_attempt(user, 'Python', 3, 5, 60.0)
+        self.assertEqual(published, [('score', {'subject': 'Python', 'username': 'frank', 'percentage': 80.0})])
+
+    def test_clearing_scores_sends_deltas(self):
+        users = [User.objects.create_user(f'fay{i}') for i in range(leaderboard.LEADERBOARD_SIZE + 1)]
+        for i, user in enumerate(users):
+            record_attempt(user, 'Python', i, len(users), i / len(users) * 100)
+        with published_events() as published, self.captureOnCommitCallbacks(execute=True):
+            clear_attempts(users[-1])
+        self.assertFalse(LeaderboardEntry.objects.filter(user=users[-1]).exists())
+        # The leader leaves, and fay0 moves up from just off the board.
+        self.assertEqual(published, [
+            ('remove', {'subject': 'Python', 'username': 'fay10'}),
+            ('score', {'subject': 'Python', 'username': 'fay0', 'percentage': 0.0}),
+        ])
+
+    async def test_stream_sends_events(self):
+        client = AsyncClient()
+        await client.aforce_login(await User.objects.acreate_user('gina'))
+        response = await client.get('/leaderboard/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+
+        receive = asyncio.ensure_future(anext(chunks))
+        while not leaderboard_events.subscriber_count():
+            await asyncio.sleep(0)
+        leaderboard_events.publish('score', {'subject': 'Python', 'username': 'gina', 'percentage': 90.0})
+        event = (await asyncio.wait_for(receive, 1)).decode()
+        self.assertEqual(json.loads(event.split('data: ')[1])['username'], 'gina')
+        await response.streaming_content.aclose()
+
+    def test_wsgi_requests_are_told_not_to_reconnect(self):
+        self.client.force_login(User.objects.create_user('gus'))
+        response = self.client.get('/leaderboard/stream/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(leaderboard_events.subscriber_count(), 0)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('hana')
+        self.client.force_login(self.user)
+        # Load the session and user so only the view's own queries remain.
+        self.client.get('/home/')
+
+    def view_queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        return response, [q['sql'] for q in ctx.captured_queries if 'auth_user' not in q['sql']]
+
+    def test_repeat_views_skip_the_database(self):
+        for path in ('/leaderboard/', '/distribution/', '/choose-subject/'):
+            self.assertNotEqual(self.view_queries(path)[1], [], path)
+            self.assertEqual(self.view_queries(path)[1], [], path)
+
+    def test_new_scores_and_questions_invalidate(self):
+        self.client.get('/leaderboard/')
+        self.client.get('/choose-subject/')
+        with self.captureOnCommitCallbacks(execute=True):
+            record_attempt(self.user, 'Python', 4, 5, 80.0)
+        response, _ = self.view_queries('/leaderboard/')
+        self.assertContains(response, 'hana')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clear_attempts(self.user)
+        response, _ = self.view_queries('/leaderboard/')
+        self.assertNotContains(response, 'hana')
+
+        Subject.objects.create(name='Rust')
+        with self.captureOnCommitCallbacks(execute=True):
+            bank.add('Rust', 'Borrow?', ['a', 'b', 'c', 'd'], 0)
+        response, _ = self.view_queries('/choose-subject/')
+        self.assertContains(response, 'Rust')
+
+    def test_deleting_a_user_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_attempt(self.user, 'Python', 4, 5, 80.0)
+        self.assertContains(self.client.get('/leaderboard/'), 'hana')
+
+        viewer = User.objects.create_user('ian')
+        self.client.force_login(viewer)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotContains(self.client.get('/leaderboard/'), 'hana')
+
+        # Scores and entries are still deleted without loading each row.
+        collector = Collector(using='default')
+        self.assertTrue(collector.can_fast_delete(Score.objects.all()))
+        self.assertTrue(collector.can_fast_delete(LeaderboardEntry.objects.all()))
+
+    def test_rebuilt_payloads_overwrite_one_key(self):
+        self.client.get('/leaderboard/')
+        for score in (60.0, 70.0):
+            with self.captureOnCommitCallbacks(execute=True):
+                record_attempt(self.user, 'Python', 3, 5, score)
+            self.client.get('/leaderboard/')
+        self.assertEqual(len([key for key in cache._cache if ':quiz:leaderboard' in key]), 1)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('ivan', is_staff=True)
+        for i in range(5):
+            record_attempt(cls.staff, 'Python', i, 5, i * 20.0)
+        record_attempt(cls.staff, 'Java', 1, 5, 20.0)
+        Score.objects.filter(subject='Java').update(date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    async def export(self, user, **params):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        response = await client.get('/export/scores/', params)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join([piece async for piece in response.streaming_content]).decode()
+
+    async def test_csv_filtered_by_subject(self):
+        response, body = await self.export(self.staff, subject='Python')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'username', 'subject', 'score', 'total', 'percentage', 'date'])
+        self.assertEqual([row[3] for row in rows[1:]], ['0', '1', '2', '3', '4'])
+        self.assertEqual({row[1] for row in rows[1:]}, {'ivan'})
+
+    async def test_ndjson_filtered_by_date(self):
+        _, body = await self.export(self.staff, format='ndjson', start='2024-01-01', end='2024-01-01')
+        self.assertEqual([json.loads(line)['subject'] for line in body.splitlines()], ['Java'])
+
+        response, _ = await self.export(self.staff, start='yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_staff_only(self):
+        response, _ = await self.export(await User.objects.acreate_user('judy'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command_pages_through_all_rows(self):
+        out = io.StringIO()
+        call_command('export_scores', '--format', 'ndjson', '--chunk-size', '2', stdout=out)
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()],
+                         list(Score.objects.order_by('id').values_list('id', flat=True)))
+
+
+class BulkImportTests(TestCase):
+    def import_text(self, text, fmt, **kwargs):
+        return bank.import_rows(parse(io.StringIO(text), fmt), **kwargs)
+
+    def test_ndjson_skips_duplicates_and_reports_bad_rows(self):
+        existing = bank.get('Python')[0]
+        lines = [
+            json.dumps({'subject': 'Python', 'question': existing['question'],
+                        'options': existing['options'], 'correct': existing['correct']}),
+            json.dumps({'subject': 'Bulk', 'question': 'One?', 'options': ['a', 'b', 'c', 'd'], 'correct': 1}),
+            json.dumps({'subject': 'Bulk', 'question': 'One?', 'options': ['a', 'b', 'c', 'd'], 'correct': 1}),
+            '{not json',
+            json.dumps({'subject': 'Bulk', 'question': 'Two?', 'options': ['a', 'b', 'c', 'd'], 'correct': 4}),
+            json.dumps({'subject': 'Bulk', 'question': 'Three?', 'options': ['a', 'b', 'c', 'd'], 'correct': 0}),
+        ]
+        created, duplicates, errors = self.import_text('\n'.join(lines), 'ndjson', batch_size=1)
+        self.assertEqual((created, duplicates), (2, 2))
+        self.assertEqual([line for line, _ in errors], [4, 5])
+        self.assertEqual([q['question'] for q in bank.get('Bulk')], ['One?', 'Three?'])
+
+    def test_exactly_four_options(self):
+        lines = [
+            json.dumps({'subject': 'Bulk', 'question': f'{n}?', 'options': ['a', 'b', 'c', 'd', 'e'][:n],
+                        'correct': 0})
+            for n in (2, 3, 5)
+        ]
+        created, _, errors = self.import_text('\n'.join(lines), 'ndjson')
+        self.assertEqual(created, 0)
+        self.assertEqual(errors, [(1, 'needs exactly 4 options, got 2'),
+                                  (2, 'needs exactly 4 options, got 3'),
+                                  (3, 'needs exactly 4 options, got 5')])
+
+    def test_csv_strict_rolls_back(self):
+        text = 'subject,question,option1,option2,option3,option4,correct\n' \
+               'Bulk,Fine?,yes,no,maybe,never,0\n' \
+               'Bulk,Broken?,yes,no,,,0\n'
+        created, _, errors = self.import_text(text, 'csv', strict=True)
+        self.assertEqual((created, [line for line, _ in errors]), (0, [3]))
+        self.assertNotIn('Bulk', bank)
+
+        created, _, _ = self.import_text(text, 'csv')
+        self.assertEqual(created, 1)
+        self.assertEqual(bank.get('Bulk')[0]['options'], ['yes', 'no', 'maybe', 'never'])
+
+    def test_csv_option_gap_is_rejected(self):
+        text = 'subject,question,option1,option2,option3,option4,correct\n' \
+               'Gap,Which?,A,,C,D,2\n'
+        created, _, errors = self.import_text(text, 'csv')
+        self.assertEqual((created, errors), (0, [(2, 'options must not be empty')]))
+
+    def test_upload_and_command(self):
+        client = self.client
+        client.force_login(User.objects.create_user('kate'))
+        upload = io.BytesIO(json.dumps({'Bulk': [
+            {'question': 'Up?', 'options': ['a', 'b', 'c', 'd'], 'correct': 0},
+        ]}).encode())
+        upload.name = 'bank.json'
+        client.post('/manage-questions/', {'action': 'import', 'file': upload})
+        self.assertEqual(len(bank.get('Bulk')), 1)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f:
+            f.write(json.dumps({'subject': 'Bulk', 'question': 'Up?', 'options': ['a', 'b', 'c', 'd'], 'correct': 0}))
+            f.flush()
+            out = io.StringIO()
+            call_command('import_questions', f.name, stdout=out)
+        self.assertIn('Imported 0 questions, skipped 1 duplicates', out.getvalue())
+
+    def test_csv_upload_with_byte_order_mark(self):
+        # Excel writes UTF-8 CSV files with a BOM in front of the header.
+        self.client.force_login(User.objects.create_user('kate'))
+        upload = io.BytesIO('subject,question,option1,option2,option3,option4,correct\n'
+                            'Bulk,Excel?,a,b,c,d,1\n'.encode('utf-8-sig'))
+        upload.name = 'bank.csv'
+        self.client.post('/manage-questions/', {'action': 'import', 'file': upload})
+        self.assertEqual([q['question'] for q in bank.get('Bulk')], ['Excel?'])
+
+
+class ScoreIngestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('liam', password='pw', is_staff=True)
+        cls.student = User.objects.create_user('mona', password='pw')
+
+    def upload(self, lines, username='liam'):
+        credentials = base64.b64encode(f'{username}:pw'.encode()).decode()
+        return self.client.post(
+            '/import/scores/', '\n'.join(lines), content_type='application/x-ndjson',
+            HTTP_AUTHORIZATION=f'Basic {credentials}',
+        )
+
+    def attempt(self, score, **fields):
+        return json.dumps({
+            'attempt_id': str(uuid.uuid4()), 'username': 'mona', 'subject': 'Python',
+            'score': score, 'total': 10, 'date': '2024-03-01 09:30:00', **fields,
+        })
+
+    def test_retried_upload_is_idempotent(self):
+        lines = [self.attempt(i) for i in range(5)]
+        lines += [self.attempt(3, username='nobody'), self.attempt(11), '{']
+        body = self.upload(lines).json()
+        self.assertEqual((body['created'], body['duplicates']), (5, 0))
+        self.assertEqual([error['line'] for error in body['errors']], [6, 7, 8])
+
+        body = self.upload(lines[:5]).json()
+        self.assertEqual((body['created'], body['duplicates']), (0, 5))
+        self.assertEqual(Score.objects.filter(user=self.student).count(), 5)
+        self.assertEqual(Score.objects.filter(user=self.student).latest('id').date.year, 2024)
+
+        entry = LeaderboardEntry.objects.get(user=self.student, subject='Python')
+        self.assertEqual(entry.percentage, 40.0)
+        rollup = SubjectStats.objects.get(subject='Python')
+        self.assertEqual((rollup.count, rollup.max), (5, 40.0))
+
+    def test_batches_fold_into_rollups_and_leaderboard(self):
+        rng = random.Random(6)
+        record_attempt(self.student, 'Python', 7, 10, 70.0)
+        lines = [
+            self.attempt(rng.randint(0, 6), username=rng.choice(['liam', 'mona']), subject=rng.choice(['Python', 'Java']),
+                         date=f'2023-0{rng.randint(1, 9)}-01 12:00:00')
+            for _ in range(40)
+        ]
+        # An older attempt that ties the web attempt takes over the entry.
+        lines.append(self.attempt(7, date='2020-01-01 00:00:00'))
+
+        with published_events() as published, self.captureOnCommitCallbacks(execute=True):
+            created, _, errors = ingest_attempts(lines, chunk_size=7)
+        self.assertEqual((created, errors), (41, []))
+        self.assertTrue(published)
+        self.assertEqual({event for event, _ in published}, {'score'})
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.student, subject='Python').date.year, 2020)
+
+        incremental = (leaderboard_rows(), rollup_rows(SubjectStats, ['subject']), rollup_rows(UserStats, ['user_id', 'subject']))
+        leaderboard.rebuild()
+        stats.rebuild()
+        rebuilt = (leaderboard_rows(), rollup_rows(SubjectStats, ['subject']), rollup_rows(UserStats, ['user_id', 'subject']))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_staff_credentials_required(self):
+        self.assertEqual(self.upload([self.attempt(1)], username='mona').status_code, 403)
+        self.assertEqual(self.client.post('/import/scores/', self.attempt(1), content_type='application/x-ndjson').status_code, 401)
+        self.assertFalse(Score.objects.exists())
+
+
+class QuestionVersionTests(TestCase):
+    def setUp(self):
+        self.question = bank.get('Python')[0]
+
+    def test_stale_edit_and_delete_are_rejected(self):
+        q = self.question
+        self.assertTrue(bank.update(q['id'], q['version'], 'First edit?', q['options'], q['correct']))
+        self.assertFalse(bank.update(q['id'], q['version'], 'Second edit?', q['options'], (q['correct'] + 1) % 4))
+        self.assertFalse(bank.delete(q['id'], q['version']))
+
+        current = bank.questions([q['id']])[0]
+        self.assertEqual(
+            (current['question'], current['correct'], current['version']),
+            ('First edit?', q['correct'], q['version'] + 1),
+        )
+
+    def test_view_reports_conflicting_edit(self):
+        q = self.question
+        bank.update(q['id'], q['version'], 'Their edit?', q['options'], q['correct'])
+        self.client.force_login(User.objects.create_user('nina'))
+        response = self.client.post('/manage-questions/', {
+            'action': 'edit', 'question_id': q['id'], 'version': q['version'], 'question': 'My edit?',
+            'option1': 'a', 'option2': 'b', 'option3': 'c', 'option4': 'd', 'correct': '1',
+        }, follow=True)
+        self.assertContains(response, 'This question was changed by someone else.')
+        self.assertEqual(bank.questions([q['id']])[0]['question'], 'Their edit?')
+
+
+def leaderboard_rows():
+    return list(LeaderboardEntry.objects.order_by('user_id', 'subject').values_list(
+        'user_id', 'subject', 'score', 'total', 'percentage', 'date',
+    ))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('olga')
+
+    def test_lower_score_keeps_best(self):
+        record_attempt(self.user, 'Python', 8, 10, 80.0)
+        record_attempt(self.user, 'Python', 5, 10, 50.0)
+        entry = LeaderboardEntry.objects.get(user=self.user, subject='Python')
+        self.assertEqual((entry.score, entry.percentage), (8, 80.0))
+
+    def test_tie_keeps_earlier_attempt(self):
+        first = record_attempt(self.user, 'Python', 4, 5, 80.0)
+        record_attempt(self.user, 'Python', 8, 10, 80.0)
+        entry = LeaderboardEntry.objects.get(user=self.user, subject='Python')
+        self.assertEqual((entry.score, entry.total, entry.date), (4, 5, first.date))
+
+    def test_rebuild_matches_incremental_updates(self):
+        rng = random.Random(4)
+        users = [self.user] + [User.objects.create_user(f'player{i}') for i in range(4)]
+        for _ in range(120):
+            # Few distinct scores, so ties are common.
+            total = rng.choice([5, 10])
+            score = rng.randint(0, total)
+            record_attempt(rng.choice(users), rng.choice(['Python', 'Java']), score, total, score / total * 100)
+
+        incremental = leaderboard_rows()
+        leaderboard.rebuild()
+        self.assertEqual(leaderboard_rows(), incremental)
+
+
+def rollup_rows(model, key):
+    return sorted(
+        (tuple(getattr(row, field) for field in key), row.count, round(row.mean, 6), round(row.stddev, 6),
+         row.min, row.max, row.buckets)
+        for row in model.objects.all()
+    )
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(5)
+        users = [User.objects.create_user(f'roller{i}') for i in range(3)]
+        for percentage in [0.0, 100.0, 99.99, 50.0, 10.0] + [rng.random() * 100 for _ in range(200)]:
+            record_attempt(rng.choice(users), rng.choice(['Python', 'Java']), 0, 1, percentage)
+
+    def test_incremental_rollups_match_rebuild(self):
+        incremental = (rollup_rows(SubjectStats, ['subject']), rollup_rows(UserStats, ['user_id', 'subject']))
+        stats.rebuild()
+        rebuilt = (rollup_rows(SubjectStats, ['subject']), rollup_rows(UserStats, ['user_id', 'subject']))
+        self.assertEqual(rebuilt, incremental)
+
+        python = SubjectStats.objects.get(subject='Python')
+        percentages = list(Score.objects.filter(subject='Python').values_list('percentage', flat=True))
+        mean = sum(percentages) / len(percentages)
+        self.assertEqual(python.count, len(percentages))
+        self.assertAlmostEqual(python.mean, mean)
+        self.assertAlmostEqual(python.stddev, (sum((p - mean) ** 2 for p in percentages) / len(percentages)) ** 0.5)
+        self.assertEqual((python.min, python.max), (min(percentages), max(percentages)))
+
+    def test_clearing_a_user_subtracts_their_rollups(self):
+        user = User.objects.get(username='roller0')
+        # Make the user hold a subject's minimum, so it has to be re-read.
+        record_attempt(user, 'Python', 0, 1, 0.0)
+        clear_attempts(user)
+        self.assertFalse(UserStats.objects.filter(user=user).exists())
+
+        incremental = rollup_rows(SubjectStats, ['subject'])
+        stats.rebuild()
+        self.assertEqual(rollup_rows(SubjectStats, ['subject']), incremental)
+
+    def test_histogram_matches_binning_raw_scores(self):
+        for bin_width in [1, 3, 7, 10, 33, 50]:
+            bins = math.ceil(100 / bin_width)
+            for rollup in SubjectStats.objects.all():
+                # How the distribution page used to bin the raw percentages.
+                expected = [0] * bins
+                for percentage in Score.objects.filter(subject=rollup.subject).values_list('percentage', flat=True):
+                    expected[min(math.floor(percentage / bin_width), bins - 1)] += 1
+                self.assertEqual(rollup.histogram(bin_width), expected, f'bin width {bin_width}')
+
+
+class HistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pete')
+        for i in range(25):
+            record_attempt(cls.user, 'Python', i % 6, 5, i * 4.0)
+        Score.objects.update(date=datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+    def test_pages_through_identical_dates_once(self):
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = score_page(self.user, cursor, limit=10)
+            seen += [row['id'] for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Score.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_malformed_cursor_starts_from_the_top(self):
+        first_page, _ = score_page(self.user, limit=5)
+        for cursor in ['abc', '1_x', '1_2_3', '_', '9' * 30 + '_1']:
+            self.assertEqual(score_page(self.user, cursor, limit=5)[0], first_page, cursor)
+
+    def test_limit_is_clamped(self):
+        self.client.force_login(self.user)
+        for limit, expected in [('1000', min(MAX_PAGE_SIZE, 25)), ('0', 1), ('-3', 1), ('many', 20)]:
+            response = self.client.get('/my-scores/history/', {'limit': limit})
+            self.assertEqual(len(response.json()['results']), expected, limit)
+
+    async def test_series_is_downsampled_to_window_means(self):
+        user = await User.objects.acreate_user('quinn')
+        percentages = [float(i % 101) for i in range(MAX_CHART_POINTS + 50)]
+        for percentage in percentages:
+            await Score.objects.acreate(user=user, subject='Python', score=0, total=1, percentage=percentage)
+
+        attempts, means = await ascore_series(user, len(percentages))
+        self.assertEqual(len(attempts), MAX_CHART_POINTS)
+        self.assertEqual(attempts[-1], len(percentages))
+        start = 0
+        for end, mean in zip(attempts, means):
+            self.assertGreater(end, start)
+            self.assertAlmostEqual(mean, sum(percentages[start:end]) / (end - start))
+            start = end
+
+        few = await User.objects.acreate_user('rita')
+        for percentage in [30.0, 60.0, 90.0]:
+            await Score.objects.acreate(user=few, subject='Python', score=0, total=1, percentage=percentage)
+        self.assertEqual(await ascore_series(few, 3), ([1, 2, 3], [30.0, 60.0, 90.0]))
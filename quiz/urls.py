@@ -12,8 +12,14 @@ urlpatterns = [
     path('result/', views.result_view, name='result'),
     path('performance/', views.performance_menu_view, name='performance_menu'),
     path('my-scores/', views.my_scores_view, name='my_scores'),
+    path('my-scores/history/', views.my_scores_history_view, name='my_scores_history'),
     path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/stream/', views.leaderboard_stream_view, name='leaderboard_stream'),
     path('distribution/', views.distribution_view, name='distribution'),
     path('manage-questions/', views.manage_questions_view, name='manage_questions'),
     path('manage-users/', views.manage_users_view, name='manage_users'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('metrics/reset/', views.metrics_reset_view, name='metrics_reset'),
+    path('export/scores/', views.export_scores_view, name='export_scores'),
+    path('import/scores/', views.import_scores_view, name='import_scores'),
 ]
\ No newline at end of file
@@ -1,27 +1,64 @@
 # quiz/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from .models import Score
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db import IntegrityError
+from django.db.models import Max, Min, Sum
+from .models import Score, SubjectStats, UserStats
 from .forms import SignUpForm, LoginForm
+from .question_bank import bank
+from .bulk_import import format_for, parse
+from .leaderboard import LEADERBOARD_SIZE, atop_scores
+from .live import leaderboard_events
+from .caching import QUESTIONS, SCORES, acached
+from .export import FORMATS, aexport_lines, parse_day, score_rows
+from .ingest import ingest_attempts
+from .attempts import record_attempt, clear_attempts
+from .stats import DEFAULT_BIN_WIDTH, bucket_labels
+from .grading import answers_from_form
+from .generator import asample_questions, questions_per_attempt, shuffle_options, unshuffle_answers
+from .middleware import view_stats
+from .history import MAX_PAGE_SIZE, PAGE_SIZE, aattempt_count, ascore_series, score_page
+import asyncio
+import base64
+import binascii
+import io
 import json
+import uuid
 from datetime import datetime
+from functools import wraps
 
 
-def load_questions():
-    try:
-        with open('questions.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+RECENT_ATTEMPTS = 10
+# Idle event streams get a comment this often so proxies keep them open.
+STREAM_HEARTBEAT = 15
+# Rejected rows listed after an upload; the rest are only counted.
+IMPORT_ERRORS_SHOWN = 5
+# Quiz pages a user may have open at once; older ones expire. Their
+# selections ride in the session cookie, so keep this small.
+OPEN_ATTEMPTS = 3
+
 
+def _with_user(view):
+    """Resolve ``request.user`` up front for an async view.
 
-def save_questions(questions):
-    with open('questions.json', 'w') as f:
-        json.dump(questions, f, indent=2)
+    The lazy user would otherwise be loaded with a synchronous query the
+    first time a template touches it, which Django refuses to do from an
+    event loop.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return wrapper
 
 
 def login_view(request):
@@ -72,53 +109,82 @@ def logout_view(request):
 
 
 @login_required
-def choose_subject_view(request):
-    questions = load_questions()
-    subjects = list(questions.keys())
+@_with_user
+async def choose_subject_view(request):
+    subjects = await acached('subjects', [QUESTIONS], bank.asubjects)
     return render(request, 'quiz/choose_subject.html', {'subjects': subjects})
 
 
-@login_required
-def quiz_view(request, subject):
-    questions = load_questions()
-
-    if subject not in questions:
+def _submit_quiz(request, subject):
+    key = bank.answer_key(subject)
+    if key is None:
         messages.error(request, 'Subject not found')
         return redirect('choose_subject')
 
+    # Each page carries its own attempt id, so a form from another tab or
+    # an older copy of the page is never graded against a newer draw.
+    attempt_id = request.POST.get('attempt')
+    selection = request.session.get('quiz_selection', {}).pop(attempt_id, None)
+    if selection is None or selection['subject'] != subject:
+        messages.error(request, 'This quiz has expired, please start again')
+        return redirect('quiz', subject=subject)
+    request.session.modified = True
+
+    question_ids, orders = selection['questions'], selection['orders']
+    answers = unshuffle_answers(answers_from_form(request.POST, len(question_ids)), orders)
+    key, kept = key.subset(question_ids)
+    if len(kept) < len(question_ids):
+        answers = [answers[i] for i in kept]
+    score = key.grade(answers)
+    total = len(key)
+    percentage = (score / total * 100) if total > 0 else 0
+
+    try:
+        record_attempt(request.user, subject, score, total, percentage, key, answers, attempt_id)
+    except IntegrityError:
+        # Sessions live in a signed cookie, so an old copy of it can still
+        # hold a selection that was already graded.
+        messages.error(request, 'This quiz was already submitted')
+        return redirect('quiz', subject=subject)
+
+    request.session['last_result'] = {
+        'subject': subject,
+        'score': score,
+        'total': total,
+        'percentage': percentage
+    }
+
+    return redirect('result')
+
+
+@login_required
+@_with_user
+async def quiz_view(request, subject):
     if request.method == 'POST':
-        subject_questions = questions[subject]
-        score = 0
-        total = len(subject_questions)
-
-        for idx, question in enumerate(subject_questions):
-            answer = request.POST.get(f'question_{idx}')
-            if answer and int(answer) == question['correct']:
-                score += 1
-
-        percentage = (score / total * 100) if total > 0 else 0
-
-        Score.objects.create(
-            user=request.user,
-            subject=subject,
-            score=score,
-            total=total,
-            percentage=percentage
-        )
+        # Grading and recording run in one transaction, which the async
+        # ORM can't hold open, so submissions take the sync path.
+        return await sync_to_async(_submit_quiz)(request, subject)
 
-        request.session['last_result'] = {
-            'subject': subject,
-            'score': score,
-            'total': total,
-            'percentage': percentage
-        }
+    if not await bank.acontains(subject):
+        messages.error(request, 'Subject not found')
+        return redirect('choose_subject')
 
-        return redirect('result')
+    subject_questions = await bank.aquestions(await asample_questions(subject, questions_per_attempt()))
+    selections = await request.session.aget('quiz_selection', {})
+    attempt = str(uuid.uuid4())
+    selections[attempt] = {
+        'subject': subject,
+        'questions': [q['id'] for q in subject_questions],
+        'orders': shuffle_options(subject_questions),
+    }
+    for expired in list(selections)[:-OPEN_ATTEMPTS]:
+        del selections[expired]
+    await request.session.aset('quiz_selection', selections)
 
-    subject_questions = questions[subject]
     return render(request, 'quiz/quiz.html', {
         'subject': subject,
-        'questions': subject_questions
+        'questions': subject_questions,
+        'attempt': attempt
     })
 
 
@@ -137,60 +203,110 @@ def performance_menu_view(request):
 
 
 @login_required
-def my_scores_view(request):
-    scores = Score.objects.filter(user=request.user).order_by('date')
+@_with_user
+async def my_scores_view(request):
+    total_attempts = await aattempt_count(request.user)
+    attempts, percentages = await ascore_series(request.user, total_attempts)
 
     score_data = {
-        'attempts': list(range(1, len(scores) + 1)),
-        'percentages': [score.percentage for score in scores]
+        'attempts': attempts,
+        'percentages': percentages
     }
 
     return render(request, 'quiz/my_scores.html', {
-        'scores': scores,
+        'total_attempts': total_attempts,
         'score_data': json.dumps(score_data)
     })
 
 
 @login_required
-def leaderboard_view(request):
-    all_scores = Score.objects.all()
-
-    subject_scores = {}
-    for score in all_scores:
-        if score.subject not in subject_scores:
-            subject_scores[score.subject] = []
-        subject_scores[score.subject].append({
-            'username': score.user.username,
-            'percentage': score.percentage
-        })
+def my_scores_history_view(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+
+    rows, next_cursor = score_page(request.user, request.GET.get('cursor'), limit)
+    return JsonResponse({
+        'results': [{
+            'subject': row['subject'],
+            'score': row['score'],
+            'total': row['total'],
+            'percentage': row['percentage'],
+            'date': row['date'].isoformat()
+        } for row in rows],
+        'next': next_cursor
+    })
+
 
-    for subject in subject_scores:
-        subject_scores[subject] = sorted(subject_scores[subject], key=lambda x: x['percentage'], reverse=True)[:10]
+@login_required
+@_with_user
+async def leaderboard_view(request):
+    async def payload():
+        return json.dumps(await atop_scores())
 
     return render(request, 'quiz/leaderboard.html', {
-        'subject_scores': json.dumps(subject_scores)
+        'subject_scores': await acached('leaderboard', [SCORES, QUESTIONS], payload),
+        'leaderboard_size': LEADERBOARD_SIZE
     })
 
 
 @login_required
-def distribution_view(request):
-    all_scores = Score.objects.all()
+async def leaderboard_stream_view(request):
+    """Server-sent events for the leaderboard page: a ``score`` event when
+    someone enters or moves on a board, ``remove`` when someone leaves one,
+    and ``reset`` when boards were rebuilt and the page should reload.
+
+    Only the ASGI server can stream. Under WSGI (runserver) Django would
+    collect the endless stream into a list and hang a thread, so the page
+    gets a 204 instead, which tells EventSource not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def events():
+        queue = leaderboard_events.subscribe()
+        try:
+            yield b'retry: 5000\n\n'
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+        finally:
+            leaderboard_events.unsubscribe(queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-    subject_data = {}
-    for score in all_scores:
-        if score.subject not in subject_data:
-            subject_data[score.subject] = []
-        subject_data[score.subject].append(score.percentage)
+
+@login_required
+@_with_user
+async def distribution_view(request):
+    try:
+        bin_width = int(request.GET.get('bin', DEFAULT_BIN_WIDTH))
+    except ValueError:
+        bin_width = DEFAULT_BIN_WIDTH
+    if not 1 <= bin_width <= 50:
+        bin_width = DEFAULT_BIN_WIDTH
+
+    async def payload():
+        rollups = [s async for s in SubjectStats.objects.filter(count__gt=0)]
+        return json.dumps({
+            'labels': bucket_labels(bin_width),
+            'counts': {s.subject: s.histogram(bin_width) for s in rollups},
+            'summary': {s.subject: {'mean': s.mean, 'stddev': s.stddev} for s in rollups}
+        })
 
     return render(request, 'quiz/distribution.html', {
-        'subject_data': json.dumps(subject_data)
+        'subject_data': await acached(f'distribution:{bin_width}', [SCORES], payload)
     })
 
 
 @login_required
 def manage_questions_view(request):
-    questions = load_questions()
-
     if request.method == 'POST':
         action = request.POST.get('action')
 
@@ -205,27 +321,21 @@ def manage_questions_view(request):
             ]
             correct = int(request.POST.get('correct')) - 1
 
-            if subject in questions:
-                questions[subject].append({
-                    'question': question_text,
-                    'options': options,
-                    'correct': correct
-                })
-                save_questions(questions)
+            if bank.add(subject, question_text, options, correct):
                 messages.success(request, 'Question added successfully!')
 
         elif action == 'delete':
-            subject = request.POST.get('subject')
-            index = int(request.POST.get('index'))
+            question_id = int(request.POST.get('question_id'))
+            version = int(request.POST.get('version'))
 
-            if subject in questions and 0 <= index < len(questions[subject]):
-                del questions[subject][index]
-                save_questions(questions)
+            if bank.delete(question_id, version):
                 messages.success(request, 'Question deleted successfully!')
+            else:
+                messages.error(request, 'This question was changed by someone else. Please review it and try again.')
 
         elif action == 'edit':
-            subject = request.POST.get('subject')
-            index = int(request.POST.get('index'))
+            question_id = int(request.POST.get('question_id'))
+            version = int(request.POST.get('version'))
             question_text = request.POST.get('question')
             options = [
                 request.POST.get('option1'),
@@ -235,18 +345,40 @@ def manage_questions_view(request):
             ]
             correct = int(request.POST.get('correct')) - 1
 
-            if subject in questions and 0 <= index < len(questions[subject]):
-                questions[subject][index] = {
-                    'question': question_text,
-                    'options': options,
-                    'correct': correct
-                }
-                save_questions(questions)
+            if bank.update(question_id, version, question_text, options, correct):
                 messages.success(request, 'Question updated successfully!')
+            else:
+                messages.error(request, 'This question was changed by someone else. Please review it and try again.')
+
+        elif action == 'import':
+            _import_questions(request)
 
         return redirect('manage_questions')
 
-    return render(request, 'quiz/manage_questions.html', {'questions': questions})
+    return render(request, 'quiz/manage_questions.html', {'questions': bank.all(with_stats=True)})
+
+
+def _import_questions(request):
+    upload = request.FILES.get('file')
+    fmt = upload and format_for(upload.name)
+    if fmt is None:
+        messages.error(request, 'Choose a .json, .ndjson or .csv file to import.')
+        return
+
+    try:
+        created, duplicates, errors = bank.import_rows(
+            parse(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), fmt),
+            replace=bool(request.POST.get('replace')),
+        )
+    except ValueError as e:
+        messages.error(request, f'Could not import {upload.name}: {e}')
+        return
+
+    messages.success(request, f'Imported {created} questions; {duplicates} were already in the bank.')
+    if errors:
+        shown = '; '.join(f'{line}: {message}' for line, message in errors[:IMPORT_ERRORS_SHOWN])
+        more = len(errors) - IMPORT_ERRORS_SHOWN
+        messages.warning(request, f'Skipped {len(errors)} invalid rows. {shown}' + (f' and {more} more.' if more > 0 else '.'))
 
 
 @login_required
@@ -255,21 +387,118 @@ def manage_users_view(request):
         action = request.POST.get('action')
 
         if action == 'clear_my_scores':
-            Score.objects.filter(user=request.user).delete()
+            clear_attempts(request.user)
             messages.success(request, 'Your scores have been reset successfully!')
 
         return redirect('manage_users')
 
-    scores = Score.objects.filter(user=request.user)
-    total_attempts = scores.count()
-    avg_score = sum(s.percentage for s in scores) / total_attempts if total_attempts > 0 else 0
+    user_stats = UserStats.objects.filter(user=request.user, count__gt=0)
+    totals = user_stats.aggregate(attempts=Sum('count'), total=Sum('total'), best=Max('max'), worst=Min('min'))
+    total_attempts = totals['attempts'] or 0
+    avg_score = totals['total'] / total_attempts if total_attempts > 0 else 0
+
+    subject_breakdown = [{
+        'subject': stats.subject,
+        'attempts': stats.count,
+        'avg_score': stats.mean,
+        'best': stats.max,
+        'worst': stats.min
+    } for stats in user_stats.order_by('subject')]
+
+    recent = list(Score.objects.filter(user=request.user).order_by('-date', '-id').values('subject', 'percentage')[:RECENT_ATTEMPTS])
 
     user_data = [{
         'id': request.user.id,
         'username': request.user.username,
         'first_name': request.user.first_name,
         'total_attempts': total_attempts,
-        'avg_score': avg_score
+        'avg_score': avg_score,
+        'best': totals['best'],
+        'worst': totals['worst'],
+        'subjects': subject_breakdown
     }]
 
-    return render(request, 'quiz/manage_users.html', {'users': user_data})
\ No newline at end of file
+    return render(request, 'quiz/manage_users.html', {
+        'users': user_data,
+        'recent_count': len(recent),
+        'recent_scores': json.dumps(recent[::-1])
+    })
+
+
+@staff_member_required
+def metrics_view(request):
+    """Per-view latency, DB time and query-count percentiles for this
+    worker process since it started or was last reset."""
+    return JsonResponse({'views': view_stats.summary()})
+
+
+@staff_member_required
+@require_POST
+def metrics_reset_view(request):
+    """Start the percentiles over, returning the ones being dropped."""
+    summary = view_stats.summary()
+    view_stats.clear()
+    return JsonResponse({'views': summary})
+
+
+@staff_member_required
+async def export_scores_view(request):
+    """Stream attempts as CSV or NDJSON. Filters: ``subject``, and
+    ``start``/``end`` days (inclusive, YYYY-MM-DD)."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f'format must be one of {", ".join(FORMATS)}'}, status=400)
+    try:
+        start = parse_day(request.GET.get('start'), 'start')
+        end = parse_day(request.GET.get('end'), 'end')
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = score_rows(request.GET.get('subject'), start, end)
+    response = StreamingHttpResponse(
+        aexport_lines(fmt, rows),
+        content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+    )
+    response['Content-Disposition'] = f'attachment; filename="scores.{fmt}"'
+    return response
+
+
+def _basic_auth_user(request):
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return authenticate(request, username=username, password=password)
+
+
+@csrf_exempt
+@require_POST
+def import_scores_view(request):
+    """Store attempts taken offline, sent as NDJSON with HTTP Basic auth by
+    a staff account. Each line is an object with ``attempt_id`` (a UUID the
+    client makes up), ``username``, ``subject``, ``score``, ``total``,
+    ``date`` and optionally ``percentage``. Sending the same attempts
+    again is harmless: known ``attempt_id``s are counted as duplicates."""
+    user = _basic_auth_user(request)
+    if user is None:
+        response = JsonResponse({'error': 'authentication required'}, status=401)
+        response['WWW-Authenticate'] = 'Basic realm="Quiz-IT"'
+        return response
+    if not user.is_staff:
+        return JsonResponse({'error': 'staff only'}, status=403)
+
+    try:
+        # Iterating the request reads the body a line at a time.
+        created, duplicates, errors = ingest_attempts(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except IntegrityError:
+        return JsonResponse({'error': 'another upload stored some of these attempts first; send the batch again'}, status=409)
+    return JsonResponse({
+        'created': created,
+        'duplicates': duplicates,
+        'errors': [{'line': line, 'error': message} for line, message in errors],
+    })
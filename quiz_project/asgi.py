@@ -32,3 +32,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz_project.settings')
 
 application = get_asgi_application()
+
+# Imported once Django is set up: static files are answered before the
+# middleware chain, which then stays async end to end (quiz.static_files).
+from quiz.static_files import StaticFiles  # noqa: E402
+
+application = StaticFiles(application)
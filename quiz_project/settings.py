@@ -144,8 +144,12 @@ INSTALLED_APPS = [
     'quiz',
 ]
 
+# Keep every entry async-capable: one sync-only middleware makes Django
+# adapt the chain around it and hold a thread for the whole of every
+# request, async views included. Static files are served ahead of the chain
+# in quiz_project/asgi.py.
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'quiz.middleware.request_metrics',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -179,9 +183,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers keep going while a worker writes, and
+            # IMMEDIATE transactions take the write lock up front so two
+            # workers editing the bank queue up instead of failing mid-way.
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# The default cache is file-based so every worker on this host sees the
+# same entries; it holds page payloads keyed on data versions
+# (quiz.caching). Sessions never touch django_session: they live in Redis
+# when QUIZ_REDIS_URL is set, and otherwise in a signed cookie, which every
+# worker can read and which survives restarts. Tests swap every cache alias
+# for in-process memory (quiz.caching.local_caches).
+REDIS_URL = os.environ.get('QUIZ_REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE', os.path.join(BASE_DIR, '.cache', 'default')),
+    },
+}
+
+if REDIS_URL:
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'quiz-sessions',
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+    SESSION_CACHE_ALIAS = 'sessions'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+TEST_RUNNER = 'quiz.test_runner.QuizTestRunner'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -208,6 +248,9 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Questions drawn from a subject's pool for each attempt.
+QUIZ_QUESTIONS_PER_ATTEMPT = 10
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 import os
@@ -24,3 +24,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz_project.settings')
 
 application = get_wsgi_application()
+
+# Imported once Django is set up: WhiteNoise is not in MIDDLEWARE, so
+# static files are answered here, as asgi.py does (quiz.static_files).
+from quiz.static_files import WSGIStaticFiles  # noqa: E402
+
+application = WSGIStaticFiles(application)
@@ -1,27 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, simpledialog
+import base64
+import io
 import json
+import queue
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from abc import ABC, abstractmethod
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
-import os
 
+from quiz.grading import AnswerKey
 
-class Database:
-    def __init__(self, db_name="quiz_app.db"):
-        # Delete existing database to start fresh
-        if os.path.exists(db_name):
-            os.remove(db_name)
-
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self.create_tables()
 
-    def create_tables(self):
-        self.cursor.execute('''
+class Database:
+    # Schema changes in order. PRAGMA user_version records how many of them
+    # a database file has had, so each launch only applies the new ones.
+    MIGRATIONS = [
+        '''
             CREATE TABLE IF NOT EXISTS questions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 subject TEXT NOT NULL,
@@ -31,10 +28,7 @@ class Database:
                 option3 TEXT NOT NULL,
                 option4 TEXT NOT NULL,
                 correct_option INTEGER NOT NULL
-            )
-        ''')
-
-        self.cursor.execute('''
+            );
             CREATE TABLE IF NOT EXISTS scores (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
@@ -43,12 +37,33 @@ class Database:
                 total INTEGER NOT NULL,
                 percentage REAL NOT NULL,
                 date TEXT NOT NULL
-            )
-        ''')
-        self.conn.commit()
+            );
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS questions_subject ON questions (subject);
+            CREATE INDEX IF NOT EXISTS scores_name_date ON scores (name, date);
+        ''',
+    ]
 
-        # Always add default questions
-        self.add_default_questions()
+    def __init__(self, db_name="quiz_app.db"):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name)
+        # WAL lets readers carry on while a score is being written.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.cursor = self.conn.cursor()
+        self.create_tables()
+
+    def create_tables(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, sql in enumerate(self.MIGRATIONS[version:], version + 1):
+            # executescript commits whatever is open first, so each
+            # migration brings its own transaction.
+            self.conn.executescript(f"BEGIN; {sql} PRAGMA user_version = {number}; COMMIT;")
+
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM questions)")
+        if not self.cursor.fetchone()[0]:
+            self.add_default_questions()
 
     def add_default_questions(self):
         default_questions = [
@@ -94,11 +109,11 @@ class Database:
         ]
 
         try:
-            self.cursor.executemany(
-                "INSERT INTO questions (subject, question, option1, option2, option3, option4, correct_option) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                default_questions
-            )
-            self.conn.commit()
+            with self.conn:
+                self.cursor.executemany(
+                    "INSERT INTO questions (subject, question, option1, option2, option3, option4, correct_option) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    default_questions
+                )
             print(f"Successfully added {len(default_questions)} questions to database")
         except Exception as e:
             print(f"Error adding questions: {e}")
@@ -158,6 +173,18 @@ class Database:
         self.conn.close()
 
 
+# How often the Tk thread checks for finished background work, in ms.
+POLL_INTERVAL = 50
+
+
+def render_png(fig):
+    """Draw ``fig`` to a base64 PNG, the form tk.PhotoImage takes. This
+    runs on the worker thread, so all Tk has to do is decode the image."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", facecolor=fig.get_facecolor())
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
 class QuizApp:
     def __init__(self, root):
         self.root = root
@@ -168,6 +195,17 @@ class QuizApp:
         print("Initializing database...")
         self.db = Database()
 
+        # Chart screens query and render on one worker thread, with its own
+        # connection since sqlite3 connections stay on the thread that made
+        # them. Results come back through a queue the Tk thread polls.
+        # Every screen change bumps view_generation, and results for an
+        # older generation are dropped.
+        self.executor = ThreadPoolExecutor(max_workers=1, initializer=self.open_worker_db)
+        self.results = queue.Queue()
+        self.pending = []
+        self.view_generation = 0
+        self.root.after(POLL_INTERVAL, self.poll_results)
+
         self.current_user = None
         self.current_subject = None
         self.current_question_index = 0
@@ -185,9 +223,79 @@ class QuizApp:
         self.show_home_page()
 
     def clear_window(self):
+        self.view_generation += 1
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
         for widget in self.root.winfo_children():
             widget.destroy()
 
+    def open_worker_db(self):
+        self.worker_db = Database(self.db.db_name)
+
+    def close_worker_db(self):
+        self.worker_db.close()
+
+    def run_in_background(self, work, on_done):
+        """Run ``work`` on the worker thread and hand its result to
+        ``on_done`` on the Tk thread, unless the screen has changed since."""
+        generation = self.view_generation
+        future = self.executor.submit(work)
+        self.pending.append(future)
+        future.add_done_callback(lambda f: self.results.put((generation, f, on_done)))
+
+    def poll_results(self):
+        while True:
+            try:
+                generation, future, on_done = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if future in self.pending:
+                self.pending.remove(future)
+            if generation != self.view_generation or future.cancelled():
+                continue
+            if future.exception() is not None:
+                messagebox.showerror("Error", f"Could not load this page: {future.exception()}")
+                self.show_performance_menu()
+            else:
+                on_done(future.result())
+        self.root.after(POLL_INTERVAL, self.poll_results)
+
+    def show_loading(self, title):
+        """Switch to a ``title`` screen saying its data is loading, and
+        return the label the chart will replace."""
+        self.clear_window()
+
+        frame = tk.Frame(self.root, bg="#1a1a2e")
+        frame.pack(expand=True, fill="both")
+
+        tk.Label(frame, text=title, font=("Arial", 20, "bold"),
+                 bg="#1a1a2e", fg="#00fff5").pack(pady=20)
+        loading = tk.Label(frame, text="Loading...", font=("Arial", 14),
+                           bg="#1a1a2e", fg="white")
+        loading.pack(pady=20)
+
+        tk.Button(frame, text="Back", command=self.show_performance_menu,
+                  font=("Arial", 12), bg="#0f3460", fg="white",
+                  width=15, height=2).pack(side="bottom", pady=10)
+        return loading
+
+    def show_chart(self, loading, png):
+        image = tk.PhotoImage(data=png)
+        loading.configure(image=image, text="")
+        loading.image = image
+
+    def close(self):
+        # The worker's connection has to be closed on the worker thread.
+        # Queued chart work is cancelled by hand rather than with
+        # cancel_futures, which would cancel this close too if a chart is
+        # still being drawn.
+        for future in self.pending:
+            future.cancel()
+        self.executor.submit(self.close_worker_db)
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
     def show_home_page(self):
         self.clear_window()
 
@@ -328,19 +436,15 @@ class QuizApp:
             messagebox.showwarning("Warning", "Please select an answer")
             return
 
-        question = self.questions[self.current_question_index]
-        selected = self.selected_option.get()
-        self.user_answers.append(selected)
-
-        if selected == question[7] - 1:
-            self.score += 1
-
+        self.user_answers.append(self.selected_option.get())
         self.current_question_index += 1
         self.display_question()
 
     def show_result(self):
         self.clear_window()
 
+        key = AnswerKey([q[0] for q in self.questions], [q[7] - 1 for q in self.questions])
+        self.score = key.grade(self.user_answers)
         percentage = (self.score / len(self.questions)) * 100
 
         self.db.save_score(
@@ -410,20 +514,24 @@ class QuizApp:
         if not name:
             return
 
-        user_scores = self.db.get_user_scores(name)
-
-        if not user_scores:
-            messagebox.showinfo("Info", "No scores found for this user")
-            return
+        loading = self.show_loading(f"Performance History - {name}")
 
-        self.clear_window()
+        def work():
+            user_scores = self.worker_db.get_user_scores(name)
+            if not user_scores:
+                return None
+            return render_png(self.my_scores_figure(name, user_scores))
 
-        frame = tk.Frame(self.root, bg="#1a1a2e")
-        frame.pack(expand=True, fill="both")
+        def done(png):
+            if png is None:
+                messagebox.showinfo("Info", "No scores found for this user")
+                self.show_performance_menu()
+            else:
+                self.show_chart(loading, png)
 
-        tk.Label(frame, text=f"Performance History - {name}", font=("Arial", 20, "bold"),
-                 bg="#1a1a2e", fg="#00fff5").pack(pady=20)
+        self.run_in_background(work, done)
 
+    def my_scores_figure(self, name, user_scores):
         fig = plt.Figure(figsize=(8, 5), facecolor="#1a1a2e")
         ax = fig.add_subplot(111)
         ax.set_facecolor("#0f3460")
@@ -439,30 +547,20 @@ class QuizApp:
         ax.tick_params(colors="white")
         ax.grid(True, alpha=0.3)
         ax.set_ylim(0, 100)
-
-        canvas = FigureCanvasTkAgg(fig, master=frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(pady=20)
-
-        tk.Button(frame, text="Back", command=self.show_performance_menu,
-                  font=("Arial", 12), bg="#0f3460", fg="white",
-                  width=15, height=2).pack(pady=10)
+        return fig
 
     def view_leaderboard(self):
-        scores = self.db.get_all_scores()
-
-        if not scores:
-            messagebox.showinfo("Info", "No scores available")
-            return
-
-        self.clear_window()
+        loading = self.show_loading("Leaderboard - Top 10")
 
-        frame = tk.Frame(self.root, bg="#1a1a2e")
-        frame.pack(expand=True, fill="both")
+        def work():
+            scores = self.worker_db.get_all_scores()
+            if not scores:
+                return None
+            return render_png(self.leaderboard_figure(scores))
 
-        tk.Label(frame, text="Leaderboard - Top 10", font=("Arial", 20, "bold"),
-                 bg="#1a1a2e", fg="#00fff5").pack(pady=20)
+        self.run_in_background(work, lambda png: self.show_scores_chart(loading, png))
 
+    def leaderboard_figure(self, scores):
         sorted_scores = sorted(scores, key=lambda x: x[5], reverse=True)[:10]
 
         fig = plt.Figure(figsize=(8, 5), facecolor="#1a1a2e")
@@ -483,30 +581,20 @@ class QuizApp:
             width = bar.get_width()
             ax.text(width, bar.get_y() + bar.get_height() / 2, f'{width:.1f}%',
                     ha='left', va='center', color='white', fontsize=10)
-
-        canvas = FigureCanvasTkAgg(fig, master=frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(pady=20)
-
-        tk.Button(frame, text="Back", command=self.show_performance_menu,
-                  font=("Arial", 12), bg="#0f3460", fg="white",
-                  width=15, height=2).pack(pady=10)
+        return fig
 
     def view_distribution(self):
-        scores = self.db.get_all_scores()
-
-        if not scores:
-            messagebox.showinfo("Info", "No scores available")
-            return
+        loading = self.show_loading("Score Distribution")
 
-        self.clear_window()
+        def work():
+            scores = self.worker_db.get_all_scores()
+            if not scores:
+                return None
+            return render_png(self.distribution_figure(scores))
 
-        frame = tk.Frame(self.root, bg="#1a1a2e")
-        frame.pack(expand=True, fill="both")
-
-        tk.Label(frame, text="Score Distribution", font=("Arial", 20, "bold"),
-                 bg="#1a1a2e", fg="#00fff5").pack(pady=20)
+        self.run_in_background(work, lambda png: self.show_scores_chart(loading, png))
 
+    def distribution_figure(self, scores):
         fig = plt.Figure(figsize=(8, 5), facecolor="#1a1a2e")
         ax = fig.add_subplot(111)
         ax.set_facecolor("#0f3460")
@@ -527,14 +615,14 @@ class QuizApp:
         ax.set_title("Score Distribution", color="white", fontsize=14)
         ax.tick_params(colors="white")
         ax.grid(True, alpha=0.3, axis='y')
+        return fig
 
-        canvas = FigureCanvasTkAgg(fig, master=frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(pady=20)
-
-        tk.Button(frame, text="Back", command=self.show_performance_menu,
-                  font=("Arial", 12), bg="#0f3460", fg="white",
-                  width=15, height=2).pack(pady=10)
+    def show_scores_chart(self, loading, png):
+        if png is None:
+            messagebox.showinfo("Info", "No scores available")
+            self.show_performance_menu()
+        else:
+            self.show_chart(loading, png)
 
     def manage_questions(self):
         self.clear_window()
@@ -764,4 +852,5 @@ class QuizApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = QuizApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.close()
\ No newline at end of file